@@ -8,21 +8,25 @@ type ExtractTextResponse = {
 };
 
 export async function extractText(
-	imageData: string
+	formData: FormData
 ): Promise<ExtractTextResponse> {
 	try {
 		if (!process.env.NEXT_PUBLIC_LAMBDA_URL) {
 			throw new Error("Lambda URL is not configured");
 		}
 
+		const image = formData.get("image");
+		if (!(image instanceof File)) {
+			throw new Error("No image provided");
+		}
+
+		// Send the raw image bytes rather than a base64 data URL
 		const response = await fetch(process.env.NEXT_PUBLIC_LAMBDA_URL, {
 			method: "POST",
 			headers: {
-				"Content-Type": "application/json",
+				"Content-Type": image.type || "application/octet-stream",
 			},
-			body: JSON.stringify({
-				image: imageData,
-			}),
+			body: await image.arrayBuffer(),
 		});
 
 		if (!response.ok) {
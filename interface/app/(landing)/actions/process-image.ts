@@ -0,0 +1,78 @@
+"use server";
+
+type ProcessImageResponse = {
+	success: boolean;
+	extractedText?: string;
+	text?: string;
+	error?: string;
+	noContent?: boolean;
+	noMedications?: boolean;
+};
+
+// Extracts and standardizes in a single Lambda invocation, so the OCR text
+// does not make a second round trip through this server.
+export async function processImage(
+	formData: FormData
+): Promise<ProcessImageResponse> {
+	try {
+		if (!process.env.NEXT_PUBLIC_PIPELINE_LAMBDA_URL) {
+			throw new Error("Pipeline Lambda URL is not configured");
+		}
+
+		const image = formData.get("image");
+		if (!(image instanceof File)) {
+			throw new Error("No image provided");
+		}
+
+		const response = await fetch(process.env.NEXT_PUBLIC_PIPELINE_LAMBDA_URL, {
+			method: "POST",
+			headers: {
+				"Content-Type": image.type || "application/octet-stream",
+			},
+			body: await image.arrayBuffer(),
+		});
+
+		if (!response.ok) {
+			return {
+				success: false,
+				error: `HTTP error! status: ${response.status}`,
+			};
+		}
+
+		const data = await response.json();
+
+		if (data.noContent || !data.rawText || data.rawText.trim() === "") {
+			return {
+				success: false,
+				noContent: true,
+				error: "No text could be extracted from the image",
+			};
+		}
+
+		if (!data.medications || data.medications.length === 0) {
+			return {
+				success: false,
+				extractedText: data.rawText,
+				noMedications: true,
+				error: "No medications or SIG codes could be identified in the text",
+			};
+		}
+
+		return {
+			success: true,
+			extractedText: data.rawText,
+			text: JSON.stringify({ medications: data.medications }),
+		};
+	} catch (error) {
+		console.error("[Server] Error details:", {
+			name: error instanceof Error ? error.name : "Unknown",
+			message: error instanceof Error ? error.message : String(error),
+			stack: error instanceof Error ? error.stack : undefined,
+		});
+
+		return {
+			success: false,
+			error: error instanceof Error ? error.message : "Unknown error occurred",
+		};
+	}
+}
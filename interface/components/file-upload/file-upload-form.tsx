@@ -15,6 +15,7 @@ import { cn, formatFileSize } from "@/lib/utils";
 import { Button } from "@/components/ui/button";
 import { extractText } from "@/app/(landing)/actions/extract-text";
 import { standardizeText } from "@/app/(landing)/actions/standardize";
+import { processImage } from "@/app/(landing)/actions/process-image";
 import { useTextProcessing } from "@/hooks/use-text-processing";
 import { toast } from "sonner";
 
@@ -37,16 +38,37 @@ export const FileUploadForm = () => {
 		try {
 			setStatus("extracting");
 
-			// Convert file to Base64
-			const base64 = await new Promise<string>((resolve, reject) => {
-				const reader = new FileReader();
-				reader.readAsDataURL(file.file);
-				reader.onload = () => resolve(reader.result as string);
-				reader.onerror = reject;
-			});
+			// Send the file itself; it is forwarded to the Lambda as raw bytes
+			const formData = new FormData();
+			formData.append("image", file.file);
+
+			// One round trip when the fused pipeline endpoint is deployed
+			if (process.env.NEXT_PUBLIC_PIPELINE_LAMBDA_URL) {
+				const result = await processImage(formData);
+				if (!result.success) {
+					if (result.noContent) {
+						toast.error("No text could be found in the image");
+						setExtractedText("");
+					} else if (result.noMedications) {
+						setExtractedText(result.extractedText || "");
+						updateFileStatus("uploaded");
+						toast.error("No medications or SIG codes found in the text");
+						setStandardizedText("");
+					} else {
+						throw new Error(result.error || "Failed to process image");
+					}
+					return;
+				}
+
+				setExtractedText(result.extractedText || "");
+				updateFileStatus("uploaded");
+				setStandardizedText(result.text || "");
+				setStatus("completed");
+				toast.success("File processed successfully");
+				return;
+			}
 
-			// Call extractText using the Base64 string
-			const extractResult = await extractText(base64);
+			const extractResult = await extractText(formData);
 			if (!extractResult.success) {
 				if (extractResult.noContent) {
 					toast.error("No text could be found in the image");
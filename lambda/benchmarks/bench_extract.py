@@ -0,0 +1,274 @@
+"""Stage-level benchmarks for the extract pipeline.
+
+Renders synthetic typed prescriptions at several page sizes, DPIs, rotations
+and noise levels, runs each one through the stages of extract.lambda_handler
+separately and prints the timings as JSON, e.g.:
+
+    python benchmarks/bench_extract.py --repeat 5 --output bench.json
+
+Stages that need the Tesseract binary or libtesseract are skipped (and
+reported as such) when they are not available.
+"""
+import argparse
+import base64
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from PIL import Image, ImageDraw, ImageFont  # noqa: E402
+import pytesseract  # noqa: E402
+
+# Keep extract's module-init self-check out of the JSON on stdout.
+with contextlib.redirect_stdout(sys.stderr):
+    import extract  # noqa: E402
+import imaging  # noqa: E402
+import ocr  # noqa: E402
+
+PRESCRIPTION_LINES = [
+    "Dr. Jane Smith, MD          DEA# AS1234563",
+    "Patient: John Doe           DOB: 01/02/1960",
+    "",
+    "Rx: Amoxicillin 500 mg capsules",
+    "Take 1 capsule by mouth every 8 hours for 10 days",
+    "Qty: 30 capsules    Refills: 0",
+    "",
+    "Rx: Lisinopril 10 mg tablets",
+    "Take 1 tablet by mouth once daily for blood pressure",
+    "Qty: 90 tablets    Refills: 3",
+    "",
+    "Rx: Metformin 500 mg tablets",
+    "Take 1 tablet by mouth twice daily with meals",
+    "Qty: 180 tablets    Refills: 1",
+]
+
+# Page sizes in inches: US letter and a small pharmacy label.
+PAGE_SIZES = {"letter": (8.5, 11.0), "label": (4.0, 6.0)}
+
+FONT_CANDIDATES = [
+    "DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+]
+
+
+def load_font(size):
+    for candidate in FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(candidate, size)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        return ImageFont.load_default()
+
+
+def render_prescription(page, dpi, rotation=0.0, noise=0.0, seed=0):
+    """Render a typed prescription page as a grayscale image."""
+    width_in, height_in = PAGE_SIZES[page]
+    size = (int(width_in * dpi), int(height_in * dpi))
+    image = Image.new("L", size, 255)
+    draw = ImageDraw.Draw(image)
+
+    # 12 pt text, one inch margins (half an inch on labels).
+    font = load_font(max(8, int(dpi * 12 / 72)))
+    margin = dpi if page == "letter" else dpi // 2
+    line_height = int(dpi * 18 / 72)
+    y = margin
+    for line in PRESCRIPTION_LINES:
+        if y + line_height > size[1] - margin // 2:
+            break
+        draw.text((margin, y), line, fill=0, font=font)
+        y += line_height
+
+    if rotation:
+        image = image.rotate(rotation, expand=True, fillcolor=255)
+
+    if noise:
+        rng = random.Random(seed)
+        pixels = image.load()
+        width, height = image.size
+        for _ in range(int(width * height * noise)):
+            x, y = rng.randrange(width), rng.randrange(height)
+            pixels[x, y] = 0 if pixels[x, y] > 127 else 255
+
+    image.info["dpi"] = (dpi, dpi)
+    return image
+
+
+def encode(image, image_format):
+    buffer = io.BytesIO()
+    if image_format == "JPEG":
+        image.save(buffer, format="JPEG", quality=90, dpi=image.info["dpi"])
+    else:
+        image.save(buffer, format=image_format, dpi=image.info["dpi"])
+    return buffer.getvalue()
+
+
+def json_event(image_bytes, image_format):
+    data_url = (
+        f"data:image/{image_format.lower()};base64,"
+        + base64.b64encode(image_bytes).decode("ascii")
+    )
+    return {"body": json.dumps({"image": data_url})}
+
+
+def binary_event(image_bytes, image_format):
+    return {
+        "body": base64.b64encode(image_bytes).decode("ascii"),
+        "isBase64Encoded": True,
+        "headers": {"content-type": f"image/{image_format.lower()}"},
+    }
+
+
+def timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def _save_to_temp(image):
+    with pytesseract.pytesseract.save(image) as (_, input_filename):
+        return os.path.getsize(input_filename)
+
+
+def run_stages(image_bytes, image_format, tesseract_ok, engine_ok):
+    """Run every stage once and return {stage: milliseconds}."""
+    timings = {}
+
+    event = json_event(image_bytes, image_format)
+    (images, _), timings["decode_json"] = timed(extract.parse_request, event)
+    event = binary_event(image_bytes, image_format)
+    (images, _), timings["decode_binary"] = timed(
+        extract.parse_request, event)
+
+    def open_and_load():
+        image = imaging.open_image(images[0])
+        image.load()
+        return image
+
+    image, timings["image_open"] = timed(open_and_load)
+    frame, timings["normalize"] = timed(
+        imaging.normalize, next(ocr.iter_frames(image)))
+
+    _, timings["prepare"] = timed(pytesseract.pytesseract.prepare, frame)
+    _, timings["save_temp"] = timed(_save_to_temp, frame)
+    encoded, timings["encode_pipe"] = timed(ocr.encode_image, frame)
+
+    text = ""
+    if tesseract_ok:
+        output, timings["tesseract_pipe"] = timed(ocr.run_tesseract, encoded)
+        text = output.decode("utf-8")
+        _, timings["tesseract_file"] = timed(
+            pytesseract.image_to_string, frame, lang=ocr.DEFAULT_LANG)
+    if engine_ok:
+        text, timings["tesseract_engine"] = timed(
+            ocr.get_engine().image_to_string, frame)
+
+    response = {
+        "text": text,
+        "pages": [{"page": 1, "text": text}],
+        "cache": "miss",
+        "status": "success",
+    }
+    _, timings["serialize"] = timed(json.dumps, response)
+    return timings
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    p95_index = max(0, int(round(0.95 * len(ordered))) - 1)
+    return {
+        "min_ms": round(ordered[0], 3),
+        "median_ms": round(statistics.median(ordered), 3),
+        "p95_ms": round(ordered[p95_index], 3),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+    }
+
+
+def tesseract_available():
+    try:
+        pytesseract.get_tesseract_version()
+    except (pytesseract.TesseractNotFoundError, SystemExit, OSError):
+        return False
+    return True
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", nargs="+", default=list(PAGE_SIZES),
+                        choices=list(PAGE_SIZES))
+    parser.add_argument("--dpis", nargs="+", type=int,
+                        default=[150, 300, 600])
+    parser.add_argument("--rotations", nargs="+", type=float,
+                        default=[0.0, 3.0])
+    parser.add_argument("--noise", nargs="+", type=float, default=[0.0, 0.02])
+    parser.add_argument("--formats", nargs="+", default=["JPEG", "PNG"],
+                        choices=["JPEG", "PNG", "TIFF", "WEBP", "BMP"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    tesseract_ok = tesseract_available()
+    engine_ok = ocr.get_engine() is not None
+
+    scenarios = []
+    for page in args.pages:
+        for dpi in args.dpis:
+            for rotation in args.rotations:
+                for noise in args.noise:
+                    image = render_prescription(page, dpi, rotation, noise)
+                    for image_format in args.formats:
+                        image_bytes = encode(image, image_format)
+                        samples = {}
+                        for _ in range(args.repeat):
+                            timings = run_stages(
+                                image_bytes, image_format, tesseract_ok,
+                                engine_ok)
+                            for stage, ms in timings.items():
+                                samples.setdefault(stage, []).append(ms)
+                        scenarios.append({
+                            "page": page,
+                            "dpi": dpi,
+                            "rotation": rotation,
+                            "noise": noise,
+                            "format": image_format,
+                            "pixels": image.size,
+                            "bytes": len(image_bytes),
+                            "stages": {
+                                stage: summarize(values)
+                                for stage, values in samples.items()
+                            },
+                        })
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": ocr.available_cpus(),
+        "repeat": args.repeat,
+        "tesseract_binary": tesseract_ok,
+        "tesseract_engine": engine_ok,
+        "target_dpi": imaging.TARGET_DPI,
+        "scenarios": scenarios,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -61,6 +61,7 @@ resource "aws_lambda_function" "extract_text" {
     variables = {
       TESSDATA_PREFIX = "/opt/lib/tessdata"
       LD_LIBRARY_PATH = "/opt/lib"
+      OCR_ENGINE      = "auto"
     }
   }
 }
@@ -87,6 +88,40 @@ resource "aws_lambda_function" "standardize_text" {
   }
 }
 
+# Create Lambda function that extracts and standardizes in one invocation
+resource "aws_lambda_function" "pipeline" {
+  filename         = "../pipeline_function.zip"
+  function_name    = "extract-standardize-pipeline"
+  role            = data.aws_iam_role.existing_lambda_role.arn
+  handler         = "pipeline.lambda_handler"
+  runtime         = "python3.9"
+  timeout         = 60
+  memory_size     = 1024
+
+  # Force update when code changes
+  source_code_hash = filebase64sha256("../pipeline_function.zip")
+
+  layers = [
+    aws_lambda_layer_version.tesseract.arn
+  ]
+
+  tags = {
+    Name        = var.project_name
+    Environment = var.environment
+    ManagedBy   = "terraform"
+    Project     = var.project_name
+  }
+
+  environment {
+    variables = {
+      TESSDATA_PREFIX = "/opt/lib/tessdata"
+      LD_LIBRARY_PATH = "/opt/lib"
+      OCR_ENGINE      = "auto"
+      OPENAI_API_KEY  = var.openai_api_key
+    }
+  }
+}
+
 # Create function URLs
 resource "aws_lambda_function_url" "extract_text_url" {
   function_name      = aws_lambda_function.extract_text.function_name
@@ -116,6 +151,20 @@ resource "aws_lambda_function_url" "standardize_text_url" {
   }
 }
 
+resource "aws_lambda_function_url" "pipeline_url" {
+  function_name      = aws_lambda_function.pipeline.function_name
+  authorization_type = "NONE"
+
+  cors {
+    allow_credentials = true
+    allow_origins     = var.allowed_origins
+    allow_methods     = ["POST"]
+    allow_headers     = ["*"]
+    expose_headers    = ["*"]
+    max_age          = 86400
+  }
+}
+
 import {
   to = aws_lambda_function.extract_text
   id = "extract-text"
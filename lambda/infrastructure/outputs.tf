@@ -27,3 +27,13 @@ output "standardize_text_url" {
   description = "URL endpoint for the text standardization Lambda"
   value       = aws_lambda_function_url.standardize_text_url.function_url
 }
+
+output "pipeline_function_name" {
+  description = "Name of the extract-and-standardize pipeline Lambda function"
+  value       = aws_lambda_function.pipeline.function_name
+}
+
+output "pipeline_url" {
+  description = "URL endpoint for the extract-and-standardize pipeline Lambda"
+  value       = aws_lambda_function_url.pipeline_url.function_url
+}
@@ -0,0 +1,277 @@
+"""Bulk offline processing of archived prescription scans into JSONL.
+
+    python bulk.py SCANS -o results.jsonl [--processes N] [--concurrency N]
+
+SCANS is a directory (searched recursively) or a .tar, .tar.gz, .tgz or
+.zip archive. Each image is decoded and OCRed in a process pool with one
+process per core, and its text is standardized on this process's event loop
+while the pool moves on to the next images. One JSON line per image is
+appended to the output as soon as it is done.
+
+The output file is also the checkpoint: on restart, images that already
+have a line are skipped (failed ones too, unless --retry-errors), and a line
+torn by a crash is discarded.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import tarfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import openai
+
+# One process per core already, so each process OCRs on a single thread.
+os.environ.setdefault("OCR_WORKERS", "1")
+
+import extract  # noqa: E402
+import ocr  # noqa: E402
+import standardize  # noqa: E402
+import upstream  # noqa: E402
+
+logger = logging.getLogger()
+
+IMAGE_EXTENSIONS = (
+    ".jpg", ".jpeg", ".png", ".tif", ".tiff", ".webp", ".bmp")
+
+
+def _is_image(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def iter_sources(path):
+    """Yield (source, path_or_bytes) for every image under path.
+
+    Directory entries are read by the OCR process itself; archive members
+    have to be read here, in archive order, and are passed as bytes.
+    """
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if _is_image(name):
+                    full = os.path.join(root, name)
+                    yield os.path.relpath(full, path), full
+    elif zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and _is_image(info.filename):
+                    yield info.filename, archive.read(info)
+    elif tarfile.is_tarfile(path):
+        # Stream mode reads the archive once, front to back.
+        with tarfile.open(path, "r|*") as archive:
+            for member in archive:
+                if member.isfile() and _is_image(member.name):
+                    yield member.name, archive.extractfile(member).read()
+    else:
+        raise ValueError(f"Not a directory, tar or zip archive: {path}")
+
+
+def ocr_source(source, data):
+    """Decode and OCR one image (runs in a pool process)."""
+    started = time.perf_counter()
+    try:
+        if isinstance(data, str):
+            with open(data, "rb") as f:
+                data = f.read()
+        result, cache_status = extract.extract_image(data)
+    except Exception as e:
+        return {
+            "source": source,
+            "status": "error",
+            "stage": "ocr",
+            "error": f"{type(e).__name__}: {e}",
+        }
+    return {
+        "source": source,
+        "status": "ok",
+        "text": result["text"],
+        "pages": len(result["pages"]),
+        "cache": {"ocr": cache_status},
+        "ocr_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+def load_checkpoint(output, retry_errors=False):
+    """Sources already recorded in output, dropping a torn last line."""
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, "rb+") as f:
+        good_bytes = 0
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            good_bytes += len(line)
+            if record.get("status") == "ok" or not retry_errors:
+                done.add(record["source"])
+            else:
+                done.discard(record["source"])
+        f.truncate(good_bytes)
+    return done
+
+
+class Runner:
+    """Pipelines OCR in the pool with standardization on the event loop."""
+
+    def __init__(self, pool, output, api_key, concurrency, in_flight,
+                 retries, checkpoint_every):
+        self.pool = pool
+        self.output = output
+        self.api_key = api_key
+        self.retries = retries
+        self.checkpoint_every = checkpoint_every
+        self.concurrency = concurrency
+        self.max_in_flight = in_flight
+        self.standardize_slots = None
+        self.in_flight = None
+        self.counts = {"ok": 0, "error": 0}
+        self.started = time.monotonic()
+
+    async def standardize(self, record):
+        text, corrections, classification = standardize.prepare_text(
+            record["text"])
+        record["prefilter"] = classification
+        record["corrections"] = standardize.corrections_body(corrections)
+        record["medications"] = []
+        if classification is not None and \
+                classification["decision"] == "no_medication":
+            return
+
+        started = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            try:
+                async with self.standardize_slots:
+                    standardized_text, cached = \
+                        await standardize.standardize_cached_async(
+                            text, self.api_key)
+                break
+            except (openai.APIError, upstream.CircuitOpenError,
+                    upstream.DeadlineExceeded) as e:
+                if attempt == self.retries:
+                    raise
+                if isinstance(e, upstream.CircuitOpenError):
+                    delay = standardize.BREAKER_RESET_SECONDS
+                else:
+                    delay = 2 ** attempt
+                logger.warning(
+                    f"{record['source']}: {e}; retrying in {delay}s")
+                await asyncio.sleep(delay)
+        record["medications"] = standardized_text["medications"]
+        record["cache"]["standardize"] = cached
+        record["standardize_ms"] = round(
+            (time.perf_counter() - started) * 1000, 2)
+
+    async def process(self, source, data):
+        try:
+            loop = asyncio.get_running_loop()
+            record = await loop.run_in_executor(
+                self.pool, ocr_source, source, data)
+            if record["status"] == "ok" and self.api_key is not None:
+                if record["text"].strip():
+                    try:
+                        await self.standardize(record)
+                    except Exception as e:
+                        record.update(
+                            status="error", stage="standardize",
+                            error=f"{type(e).__name__}: {e}")
+                else:
+                    record["medications"] = []
+            self.write(record)
+        finally:
+            self.in_flight.release()
+
+    def write(self, record):
+        self.output.write(json.dumps(record) + "\n")
+        self.output.flush()
+        self.counts[record["status"]] += 1
+        total = sum(self.counts.values())
+        if total % self.checkpoint_every == 0:
+            os.fsync(self.output.fileno())
+            rate = total / (time.monotonic() - self.started)
+            logger.info(
+                f"{total} images ({self.counts['error']} errors), "
+                f"{rate:.1f}/s")
+
+    async def run(self, sources):
+        # Created here so they belong to the loop that runs them.
+        self.standardize_slots = asyncio.Semaphore(max(1, self.concurrency))
+        self.in_flight = asyncio.Semaphore(max(1, self.max_in_flight))
+        tasks = set()
+        for source, data in sources:
+            # Blocks reading further ahead once enough images are in flight.
+            await self.in_flight.acquire()
+            task = asyncio.ensure_future(self.process(source, data))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        os.fsync(self.output.fileno())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="directory, tar or zip archive")
+    parser.add_argument(
+        "-o", "--output", required=True, help="JSONL file to append to")
+    parser.add_argument(
+        "--processes", type=int, default=ocr.available_cpus(),
+        help="OCR processes (default: one per core)")
+    parser.add_argument(
+        "--concurrency", type=int, default=8,
+        help="OpenAI requests in flight")
+    parser.add_argument(
+        "--no-standardize", action="store_true",
+        help="only OCR; do not call OpenAI")
+    parser.add_argument(
+        "--retry-errors", action="store_true",
+        help="reprocess images whose recorded result is an error")
+    parser.add_argument(
+        "--retries", type=int, default=2,
+        help="retries for OpenAI errors per image")
+    parser.add_argument(
+        "--checkpoint-every", type=int, default=100,
+        help="fsync the output and log progress every N images")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    api_key = None
+    if not args.no_standardize:
+        api_key = os.environ.get("OPENAI_API_KEY")
+        if not api_key:
+            parser.error("OPENAI_API_KEY is not set (or use --no-standardize)")
+
+    done = load_checkpoint(args.output, args.retry_errors)
+    if done:
+        logger.info(f"Resuming: {len(done)} images already recorded")
+    sources = (
+        (source, data) for source, data in iter_sources(args.input)
+        if source not in done)
+
+    with ProcessPoolExecutor(
+            max_workers=args.processes,
+            mp_context=multiprocessing.get_context("spawn")) as pool, \
+            open(args.output, "a", encoding="utf-8") as output:
+        runner = Runner(
+            pool, output, api_key, args.concurrency,
+            in_flight=args.processes * 2 + args.concurrency,
+            retries=args.retries, checkpoint_every=args.checkpoint_every)
+        standardize.run(runner.run(sources))
+
+    logger.info(
+        f"Done: {runner.counts['ok']} ok, {runner.counts['error']} errors")
+    return 1 if runner.counts["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+def content_key(data, *parts):
+    """Hash raw bytes together with the settings that affect the result."""
+    digest = hashlib.sha256(data)
+    for part in parts:
+        digest.update(b"\0")
+        digest.update(str(part).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """A thread-safe in-memory cache that evicts the least recently used key.
+
+    Entries expire ttl seconds after they are set when ttl is given.
+    """
+
+    def __init__(self, max_entries=256, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.max_entries <= 0:
+            return
+        expires_at = None
+        if self.ttl is not None:
+            expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DiskCache:
+    """JSON values stored one file per key, bounded by total size in bytes.
+
+    The directory is scanned once, oldest mtime first, into an in-memory LRU
+    index of file sizes; after that a set() evicts the least recently used
+    files until the total fits, without rescanning. Hits bump the mtime so
+    the order survives a restart. Files another process writes into the
+    same directory are indexed when this process reads them.
+    """
+
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sizes = OrderedDict()
+        self._total = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _load_index(self):
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, entry.name[:-5], stat.st_size))
+        entries.sort()
+        for _, key, size in entries:
+            self._sizes[key] = size
+            self._total += size
+
+    def _track(self, key, size):
+        """Record key's size as most recently used (lock held)."""
+        self._total += size - self._sizes.pop(key, 0)
+        self._sizes[key] = size
+
+    def _forget(self, key):
+        self._total -= self._sizes.pop(key, 0)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+                size = os.fstat(f.fileno()).st_size
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self._forget(key)
+            return None
+        with self._lock:
+            self._track(key, size)
+        return value
+
+    def set(self, key, value):
+        path = self._path(key)
+        # A unique temp file: several processes may share the directory.
+        fd, tmp_path = tempfile.mkstemp(
+            dir=self.directory, prefix=f"{key}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(value, f)
+                f.flush()
+                size = os.fstat(f.fileno()).st_size
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        with self._lock:
+            self._track(key, size)
+            self._evict()
+
+    def _evict(self):
+        """Remove least recently used files until the total fits."""
+        while self._total > self.max_bytes and self._sizes:
+            key, size = self._sizes.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def __len__(self):
+        return len(self._sizes)
+
+
+class SQLiteCache:
+    """JSON values in a local SQLite file, with TTL and an entry bound.
+
+    Unlike DiskCache this survives as a single file, so it can be shared by
+    processes on the same host. Least recently read entries are pruned once
+    the table grows past max_entries.
+    """
+
+    def __init__(self, path, ttl=None, max_entries=10000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL,"
+            " accessed_at REAL NOT NULL)"
+        )
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute(
+                "UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def set(self, key, value):
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache"
+                " (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, now),
+            )
+            self._prune(now)
+
+    def _prune(self, now):
+        self._conn.execute(
+            "DELETE FROM cache WHERE expires_at IS NOT NULL"
+            " AND expires_at <= ?", (now,))
+        count, = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache"
+                " ORDER BY accessed_at LIMIT ?)", (count - self.max_entries,))
+
+
+class TieredCache:
+    """An in-memory tier in front of an optional disk tier.
+
+    get() returns (value, tier) where tier is "memory", "disk" or "miss";
+    disk hits are promoted into memory.
+    """
+
+    def __init__(self, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            return value, "memory"
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+                return value, "disk"
+        return None, "miss"
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value)
+            except OSError:
+                # /tmp is best effort; the memory tier still has the value.
+                pass
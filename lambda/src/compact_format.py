@@ -0,0 +1,107 @@
+"""Compact wire format for model output.
+
+Instead of a pretty-printed JSON object per medication, the model writes one
+line per medication with the fields in a fixed order, separated by '|', and
+'-' for a missing value:
+
+    Amoxicillin|1 CAP PO Q8H|500 mg|every 8 hours|30 capsules|None|-
+
+decode() expands that into the same medication objects the JSON prompt
+produced, so the response the front end sees is unchanged.
+"""
+
+FIELDS = (
+    "medication",
+    "sig_code",
+    "dosage",
+    "frequency",
+    "quantity",
+    "refills",
+    "purpose",
+)
+
+SEPARATOR = "|"
+NULL = "-"
+
+SYSTEM_PROMPT = """You are a medical assistant tasked with extracting structured medication information and generating SIG codes.
+For each medication output exactly one line with these 7 fields in this order, separated by '|':
+medication|sig_code|dosage|frequency|quantity|refills|purpose
+
+- medication: The name of the medication
+- sig_code: The standardized SIG code
+- dosage: The medication dosage
+- frequency: How often to take the medication
+- quantity: The total amount prescribed
+- refills: Number of refills or None
+- purpose: The purpose of the medication if specified
+
+Write - for any field that is not provided. Never use '|' inside a field.
+Output only these lines: no header, no numbering, no code fences, no other text.
+If there are no medications, output nothing.
+
+Example output:
+Amoxicillin|1 CAP PO Q8H|500 mg|every 8 hours|30 capsules|None|-"""
+
+
+def _is_noise(line):
+    """Lines that carry no medication: blanks, fences, headers and prose."""
+    stripped = line.strip()
+    return (
+        SEPARATOR not in stripped
+        or stripped.lower().replace(" ", "") == SEPARATOR.join(FIELDS)
+    )
+
+
+def decode_line(line):
+    """Expand one compact line into a medication object."""
+    values = [value.strip() for value in line.strip().split(SEPARATOR)]
+    # Tolerate a leading/trailing separator ("|a|b|...|g|").
+    if len(values) == len(FIELDS) + 2 and not values[0] and not values[-1]:
+        values = values[1:-1]
+    if len(values) != len(FIELDS):
+        raise ValueError(
+            f"Expected {len(FIELDS)} fields per medication, "
+            f"got {len(values)}: {line!r}")
+    return {
+        field: (None if value in ("", NULL) else value)
+        for field, value in zip(FIELDS, values)
+    }
+
+
+def decode(text):
+    """Expand compact model output into a list of medication objects."""
+    return [
+        decode_line(line) for line in text.splitlines() if not _is_noise(line)
+    ]
+
+
+def validate(medications):
+    """Check decoded medications have exactly the response schema."""
+    if not isinstance(medications, list):
+        raise ValueError("Medications must be a list")
+    for med in medications:
+        if not isinstance(med, dict) or tuple(med) != FIELDS:
+            raise ValueError(f"Malformed medication object: {med!r}")
+        for field, value in med.items():
+            if value is not None and not isinstance(value, str):
+                raise ValueError(
+                    f"Field {field} must be a string or null: {value!r}")
+    return medications
+
+
+class StreamDecoder:
+    """Decode compact output incrementally, one medication per full line."""
+
+    def __init__(self):
+        self._pending = ""
+
+    def feed(self, chunk):
+        self._pending += chunk
+        *lines, self._pending = self._pending.split("\n")
+        return [decode_line(line) for line in lines if not _is_noise(line)]
+
+    def close(self):
+        line, self._pending = self._pending, ""
+        if _is_noise(line):
+            return []
+        return [decode_line(line)]
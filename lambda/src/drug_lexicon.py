@@ -0,0 +1,179 @@
+"""A compact lexicon of common drug names.
+
+Besides exact lookups, misread drug names are corrected by undoing the
+character confusions Tesseract is known for (rn for m, cl for d, 0 for o).
+The lexicon is far from a full ingredient list, so nearby spellings are
+never rewritten on distance alone.
+"""
+import re
+
+# Frequently prescribed generics plus a few common brand names, lower case.
+DRUG_NAMES = (
+    "acetaminophen", "acyclovir", "adalimumab", "albuterol", "alendronate",
+    "allopurinol", "alprazolam", "amiodarone", "amitriptyline", "amlodipine",
+    "amoxicillin", "amphetamine", "anastrozole", "apixaban", "aripiprazole",
+    "aspirin", "atenolol", "atomoxetine", "atorvastatin", "azathioprine",
+    "azithromycin", "baclofen", "benazepril", "benzonatate", "benztropine",
+    "bisoprolol", "budesonide", "bumetanide", "buprenorphine", "bupropion",
+    "buspirone", "butalbital", "calcitriol", "canagliflozin", "captopril",
+    "carbamazepine", "carbidopa", "carisoprodol", "carvedilol", "cefadroxil",
+    "cefdinir", "cefuroxime", "celecoxib", "cephalexin", "cetirizine",
+    "chlorthalidone", "cholecalciferol", "cilostazol", "ciprofloxacin",
+    "citalopram", "clarithromycin", "clindamycin", "clobetasol",
+    "clonazepam", "clonidine", "clopidogrel", "clotrimazole", "clozapine",
+    "colchicine", "cyclobenzaprine", "cyclosporine", "dapagliflozin",
+    "desvenlafaxine", "dexamethasone", "dexmethylphenidate",
+    "dextroamphetamine", "diazepam", "diclofenac", "dicyclomine", "digoxin",
+    "diltiazem", "diphenhydramine", "divalproex", "docusate", "donepezil",
+    "doxazosin", "doxepin", "doxycycline", "dulaglutide", "duloxetine",
+    "empagliflozin", "enalapril", "enoxaparin", "entecavir", "epinephrine",
+    "ergocalciferol", "erythromycin", "escitalopram", "esomeprazole",
+    "estradiol", "eszopiclone", "ethinyl", "ezetimibe", "famotidine",
+    "febuxostat", "fenofibrate", "fentanyl", "ferrous", "fexofenadine",
+    "finasteride", "fluconazole", "fludrocortisone", "fluoxetine",
+    "fluticasone", "fluvoxamine", "folic", "formoterol", "fosinopril",
+    "furosemide", "gabapentin", "gemfibrozil", "glimepiride", "glipizide",
+    "glyburide", "guanfacine", "haloperidol", "hydralazine",
+    "hydrochlorothiazide", "hydrocodone", "hydrocortisone", "hydromorphone",
+    "hydroxychloroquine", "hydroxyzine", "ibandronate", "ibuprofen",
+    "indapamide", "indomethacin", "insulin", "ipratropium", "irbesartan",
+    "isosorbide", "ivermectin", "ketoconazole", "ketorolac", "labetalol",
+    "lacosamide", "lactulose", "lamotrigine", "lansoprazole", "latanoprost",
+    "leflunomide", "letrozole", "levetiracetam", "levocetirizine",
+    "levofloxacin", "levonorgestrel", "levothyroxine", "linaclotide",
+    "liraglutide", "lisdexamfetamine", "lisinopril", "lithium",
+    "loperamide", "loratadine", "lorazepam", "losartan", "lovastatin",
+    "lurasidone", "meclizine", "medroxyprogesterone", "meloxicam",
+    "memantine", "mercaptopurine", "mesalamine", "metformin", "methadone",
+    "methimazole", "methocarbamol", "methotrexate", "methylphenidate",
+    "methylprednisolone", "metoclopramide", "metolazone", "metoprolol",
+    "metronidazole", "minocycline", "minoxidil", "mirtazapine",
+    "montelukast", "morphine", "mupirocin", "mycophenolate", "nabumetone",
+    "nadolol", "naloxone", "naltrexone", "naproxen", "nebivolol",
+    "nifedipine", "nitrofurantoin", "nitroglycerin", "norethindrone",
+    "nortriptyline", "nystatin", "olanzapine", "olmesartan", "omeprazole",
+    "ondansetron", "oseltamivir", "oxcarbazepine", "oxybutynin",
+    "oxycodone", "pantoprazole", "paroxetine", "penicillin", "phenazopyridine",
+    "phentermine", "phenytoin", "pioglitazone", "potassium", "pramipexole",
+    "pravastatin", "prazosin", "prednisolone", "prednisone", "pregabalin",
+    "primidone", "progesterone", "promethazine", "propranolol",
+    "quetiapine", "quinapril", "raloxifene", "ramipril", "ranitidine",
+    "risperidone", "rivaroxaban", "rizatriptan", "ropinirole",
+    "rosuvastatin", "semaglutide", "sertraline", "sildenafil",
+    "simvastatin", "sitagliptin", "sotalol", "spironolactone",
+    "sucralfate", "sulfamethoxazole", "sumatriptan", "tacrolimus",
+    "tadalafil", "tamoxifen", "tamsulosin", "telmisartan", "temazepam",
+    "terazosin", "terbinafine", "testosterone", "timolol", "tiotropium",
+    "tizanidine", "topiramate", "torsemide", "tramadol", "trazodone",
+    "triamcinolone", "triamterene", "trimethoprim", "valacyclovir",
+    "valsartan", "venlafaxine", "verapamil", "warfarin", "zolpidem",
+    "ziprasidone", "zonisamide",
+    # Common brand names.
+    "adderall", "advair", "eliquis", "humalog", "januvia", "jardiance",
+    "lantus", "lasix", "lipitor", "norvasc", "ozempic", "plavix",
+    "synthroid", "tylenol", "xarelto", "zoloft",
+)
+
+DRUG_INDEX = frozenset(DRUG_NAMES)
+
+TOKEN_RE = re.compile(r"[a-z]+")
+
+# Tokens shorter than this are too ambiguous to correct.
+MIN_CORRECTION_LENGTH = 5
+
+# Character sequences Tesseract returns in place of others, as (read, meant)
+# pairs. Only these substitutions are undone: a token that is merely a few
+# edits away from a lexicon name is as likely to be a different drug the
+# lexicon does not list (nizatidine is two edits from tizanidine).
+OCR_CONFUSIONS = (
+    ("rn", "m"), ("m", "rn"), ("cl", "d"), ("d", "cl"),
+    ("1", "l"), ("0", "o"), ("5", "s"), ("8", "b"),
+)
+
+# Substitutions undone per token, which bounds the readings tried.
+MAX_CONFUSIONS = 2
+
+# Prescription vocabulary that must never be "corrected" into a drug name.
+COMMON_WORDS = frozenset((
+    "tablet", "tablets", "capsule", "capsules", "daily", "mouth", "hours",
+    "refill", "refills", "every", "twice", "times", "needed", "before",
+    "after", "meals", "morning", "evening", "bedtime", "patient", "doctor",
+    "pharmacy", "quantity", "dispense", "directed", "inhale", "inhaler",
+    "apply", "topical", "solution", "suspension", "cream", "ointment",
+    "injection", "units", "drops", "weekly", "monthly", "substitution",
+    "generic", "signature", "address", "phone", "street", "date", "total",
+))
+
+CANDIDATE_TOKEN_RE = re.compile(r"\b[A-Za-z][A-Za-z0-9]{%d,}\b" % (
+    MIN_CORRECTION_LENGTH - 1))
+
+
+def readings(word, limit=MAX_CONFUSIONS):
+    """All strings word could have been before up to limit OCR confusions."""
+    results = set()
+
+    def expand(prefix, rest, remaining):
+        if not rest:
+            results.add(prefix)
+            return
+        expand(prefix + rest[0], rest[1:], remaining)
+        if remaining:
+            for read, meant in OCR_CONFUSIONS:
+                if rest.startswith(read):
+                    expand(prefix + meant, rest[len(read):], remaining - 1)
+
+    expand("", word, limit)
+    return results
+
+
+def correct_token(token):
+    """Return the drug name an OCR token was misread from, or None.
+
+    Only a single lexicon name reachable by undoing OCR_CONFUSIONS counts;
+    ambiguous tokens are left alone.
+    """
+    word = token.lower()
+    if word in DRUG_INDEX or word in COMMON_WORDS:
+        return None
+    candidates = {
+        reading for reading in readings(word) if reading in DRUG_INDEX}
+    if len(candidates) != 1:
+        return None
+    return candidates.pop()
+
+
+def _match_case(original, correction):
+    if original.isupper():
+        return correction.upper()
+    if original[0].isupper():
+        return correction.capitalize()
+    return correction
+
+
+def correct_text(text):
+    """Replace misread drug names in text with their lexicon spelling.
+
+    Returns (corrected_text, [(original, corrected), ...]).
+    """
+    corrections = []
+
+    def replace(match):
+        token = match.group(0)
+        correction = correct_token(token)
+        if correction is None:
+            return token
+        corrected = _match_case(token, correction)
+        corrections.append((token, corrected))
+        return corrected
+
+    return CANDIDATE_TOKEN_RE.sub(replace, text), corrections
+
+
+def tokens(text):
+    """Lower-case alphabetic tokens of a text."""
+    return TOKEN_RE.findall(text.lower())
+
+
+def find_drugs(text):
+    """Return the lexicon drug names that appear in text, in order."""
+    return [token for token in tokens(text) if token in DRUG_INDEX]
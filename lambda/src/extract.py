@@ -1,123 +1,366 @@
 import json
-import base64
-import pytesseract
-from PIL import Image
-import io
+import binascii
 import os
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
+import cache
+import imaging
+import ocr
+import timing
 
-def lambda_handler(event, context):
+# Set DEBUG=1 to dump the environment and layer contents once per container.
+DEBUG = os.environ.get('DEBUG', '').lower() in ('1', 'true', 'yes')
+
+OCR_LANG = os.environ.get('OCR_LANG', ocr.DEFAULT_LANG)
+OCR_CONFIG = os.environ.get('OCR_CONFIG', '')
+
+# OCR results keyed by a hash of the decoded image plus the OCR settings.
+# Set OCR_CACHE_DISK_BYTES=0 to keep only the in-memory tier.
+OCR_CACHE_ENTRIES = int(os.environ.get('OCR_CACHE_ENTRIES', '128'))
+OCR_CACHE_DIR = os.environ.get('OCR_CACHE_DIR', '/tmp/ocr-cache')
+OCR_CACHE_DISK_BYTES = int(
+    os.environ.get('OCR_CACHE_DISK_BYTES', str(128 * 1024 * 1024)))
+
+
+def _build_cache():
+    disk = None
+    if OCR_CACHE_DISK_BYTES > 0:
+        try:
+            disk = cache.DiskCache(OCR_CACHE_DIR, OCR_CACHE_DISK_BYTES)
+        except OSError as e:
+            print(f"OCR disk cache disabled: {str(e)}")
+    return cache.TieredCache(cache.LRUCache(OCR_CACHE_ENTRIES), disk)
+
+
+OCR_CACHE = _build_cache()
+
+# Batch requests: at most MAX_BATCH_IMAGES per call, BATCH_CONCURRENCY images
+# in flight at once (their pages share the OCR pool).
+MAX_BATCH_IMAGES = int(os.environ.get('MAX_BATCH_IMAGES', '50'))
+BATCH_CONCURRENCY = int(
+    os.environ.get('BATCH_CONCURRENCY', '0')) or ocr.OCR_WORKERS
+_batch_executor = None
+
+
+def _run_diagnostic(cmd):
+    try:
+        return subprocess.check_output(cmd, text=True, stderr=subprocess.STDOUT)
+    except Exception as e:
+        return f"Error running {' '.join(cmd)}: {str(e)}"
+
+
+def self_check():
+    """Check the Tesseract layer once per container and return the result."""
+    tesseract_path = ocr.TESSERACT_CMD
+    check = {
+        'tesseract_cmd': tesseract_path,
+        'tesseract_exists': os.path.exists(tesseract_path),
+        'tesseract_permissions': None,
+        'tessdata': [],
+    }
+    if check['tesseract_exists']:
+        check['tesseract_permissions'] = oct(
+            os.stat(tesseract_path).st_mode)[-3:]
     try:
-        # Log the entire event object
-        # print("=== INCOMING EVENT ===")
-        # print("Event type:", type(event))
-        # print("Event contents:", json.dumps(event, indent=2))
-
-        # Check if body exists and its type
-        print("\n=== REQUEST BODY CHECK ===")
-        if 'body' not in event:
-            raise ValueError("No body in event")
-
-        print("Body type:", type(event['body']))
-        if isinstance(event['body'], str):
-            body = json.loads(event['body'])
-        else:
-            body = event['body']
-
-        print("Parsed body:", json.dumps(body, indent=2))
-
-        print("=== ENVIRONMENT AND SYSTEM INFO ===")
-        # Print all environment variables
-        print("\nAll Environment Variables:")
+        check['tessdata'] = sorted(os.listdir(ocr.TESSDATA_PREFIX))
+    except OSError as e:
+        check['tessdata_error'] = str(e)
+
+    print("=== TESSERACT SELF-CHECK ===")
+    print(json.dumps(check))
+
+    if DEBUG:
+        print("=== ENVIRONMENT VARIABLES ===")
         for key, value in os.environ.items():
             print(f"{key}: {value}")
+        print("=== /opt DIRECTORY TREE ===")
+        print(_run_diagnostic(['find', '/opt', '-type', 'f']))
+        print("=== LAYER LIBRARIES ===")
+        print(_run_diagnostic(['ldd', tesseract_path]))
+        print("=== TESSDATA CONTENTS ===")
+        print(_run_diagnostic(['ls', '-l', ocr.TESSDATA_PREFIX]))
 
-        print("\n=== DIRECTORY STRUCTURE ===")
-        # Check entire /opt directory structure
-        print("\nComplete /opt directory tree:")
-        try:
-            print(subprocess.check_output(
-                ['find', '/opt', '-type', 'f'], text=True))
-        except Exception as e:
-            print(f"Error listing /opt directory: {str(e)}")
+    return check
+
+
+SELF_CHECK = self_check()
+
+
+def _header(event, name):
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name:
+            return value
+    return ''
+
+
+def _raw_body(event):
+    """The request body as bytes, decoding the Function URL's base64 once."""
+    body = event['body']
+    if event.get('isBase64Encoded'):
+        return binascii.a2b_base64(body)
+    if isinstance(body, str):
+        return body.encode('utf-8')
+    return body
+
+
+def _multipart_parts(body, content_type):
+    """Split a multipart/form-data body into (name, filename, content).
+
+    name and filename come from each part's Content-Disposition header, or
+    are None when it lacks them.
+    """
+    # Imported here: the email package adds to every cold start, and only
+    # multipart uploads need it.
+    from email.parser import BytesHeaderParser
+    from email.utils import collapse_rfc2231_value
+
+    boundary = None
+    for param in content_type.split(';')[1:]:
+        name, _, value = param.strip().partition('=')
+        if name.lower() == 'boundary':
+            boundary = value.strip('"').encode('latin-1')
+    if not boundary:
+        raise ValueError("Multipart body has no boundary")
+
+    parts = []
+    for part in body.split(b'--' + boundary)[1:]:
+        if part.startswith(b'--'):
+            break
+        headers, separator, content = part.partition(b'\r\n\r\n')
+        if not separator:
+            continue
+        if content.endswith(b'\r\n'):
+            content = content[:-2]
+        message = BytesHeaderParser().parsebytes(headers.lstrip(b'\r\n'))
+        name = message.get_param('name', header='content-disposition')
+        if name is not None:
+            name = collapse_rfc2231_value(name)
+        parts.append((name, message.get_filename(), content))
+    return parts
+
+
+def _data_url_image(data_url):
+    """Decode a data URL (or bare base64 string) in a single pass."""
+    if not isinstance(data_url, str) or not data_url:
+        raise ValueError("No image data provided")
+    if data_url.startswith('data:'):
+        comma = data_url.find(',')
+        if comma == -1:
+            raise ValueError("Invalid image data format")
+        data_url = data_url[comma + 1:]
+    try:
+        return binascii.a2b_base64(data_url)
+    except binascii.Error as e:
+        raise ValueError("Invalid image data format") from e
 
-        # Check layer contents
-        print("\nLayer libraries:")
-        try:
-            print(subprocess.check_output(
-                ['ldd', '/opt/bin/tesseract'], text=True))
-        except Exception as e:
-            print(f"Error checking libraries: {str(e)}")
 
-        # Check tessdata
-        print("\nTessdata contents:")
+def _decode_each(data_urls):
+    """Decode a batch, keeping a ValueError in place of each bad entry."""
+    images = []
+    for data_url in data_urls:
         try:
-            print(subprocess.check_output(
-                ['ls', '-l', '/opt/lib/tessdata'], text=True))
-        except Exception as e:
-            print(f"Error listing tessdata: {str(e)}")
-
-        # Debug: Print environment variables and file structure
-        # print("Environment variables:")
-        # print(f"LD_LIBRARY_PATH: {os.environ.get('LD_LIBRARY_PATH')}")
-        # print(f"TESSDATA_PREFIX: {os.environ.get('TESSDATA_PREFIX')}")
-        # print(f"PATH: {os.environ.get('PATH')}")
-
-        # print("\nDirectory contents:")
-        # print("/opt contents:")
-        # print(subprocess.check_output(['ls', '-lR', '/opt']).decode())
-
-        print("\nTesseract binary check:")
-        tesseract_path = '/opt/bin/tesseract'
-        if os.path.exists(tesseract_path):
-            print(f"Tesseract exists at {tesseract_path}")
-            print(
-                f"File permissions: {oct(os.stat(tesseract_path).st_mode)[-3:]}")
-        else:
-            print(f"Tesseract not found at {tesseract_path}")
-
-        # Set environment variables for Tesseract
-        os.environ['LD_LIBRARY_PATH'] = '/opt/lib'
-        os.environ['TESSDATA_PREFIX'] = '/opt/lib/tessdata'
-        pytesseract.pytesseract.tesseract_cmd = '/opt/bin/tesseract'
-
-        # Parse the request body
-        body = json.loads(event['body'])
-
-        # Debug logging
-        print("Request body:", body)
-        print("Image data type:", type(body.get('image')))
-
-        # Validate image data
-        if not body.get('image'):
+            images.append(_data_url_image(data_url))
+        except ValueError as e:
+            images.append(e)
+    return images
+
+
+def parse_request(event):
+    """Extract the uploaded image(s) from a raw, multipart or JSON request.
+
+    Returns (images, batch). Raw uploads (image/* or
+    application/octet-stream) and multipart forms arrive from the Function URL
+    base64 encoded with isBase64Encoded set and are decoded straight into the
+    image bytes. JSON bodies carry an "image" data URL, or an "images" array
+    for a batch. Multipart forms with several files, or with "images" parts,
+    are batches too. In a batch, entries that fail to decode are returned as
+    ValueError instances so they can be reported per image.
+    """
+    if 'body' not in event or not event['body']:
+        raise ValueError("No body in event")
+
+    content_type = _header(event, 'content-type')
+    media_type = content_type.split(';')[0].strip().lower()
+
+    if media_type.startswith('image/') or \
+            media_type == 'application/octet-stream':
+        return [_raw_body(event)], False
+
+    if media_type == 'multipart/form-data':
+        parts = _multipart_parts(_raw_body(event), content_type)
+        named = [content for name, _, content in parts if name == 'image']
+        if named:
+            return named[:1], False
+        files = [content for name, filename, content in parts
+                 if name == 'images' or filename is not None]
+        if not files:
             raise ValueError("No image data provided")
+        return files, len(files) > 1 or any(
+            name == 'images' for name, _, _ in parts)
 
-        # Get the base64 encoded image
-        image_parts = body['image'].split(',')
-        if len(image_parts) != 2:
-            raise ValueError("Invalid image data format")
+    body = event['body']
+    if event.get('isBase64Encoded'):
+        body = _raw_body(event)
+    if not isinstance(body, dict):
+        body = json.loads(body)
+
+    if DEBUG:
+        print("Parsed body keys:", list(body))
+
+    if 'images' in body:
+        if not isinstance(body['images'], list) or not body['images']:
+            raise ValueError("images must be a non-empty array")
+        return _decode_each(body['images']), True
 
-        image_data = image_parts[1]
-        image_bytes = base64.b64decode(image_data)
+    # Validate image data
+    if not body.get('image'):
+        raise ValueError("No image data provided")
+    return [_data_url_image(body['image'])], False
+
+
+def extract_image(image_bytes, timer=timing.NULL_TIMER):
+    """OCR one image, returning ({'text', 'pages'}, cache_status)."""
+    with timer.span('cache'):
+        cache_key = cache.content_key(
+            image_bytes, OCR_LANG, OCR_CONFIG, imaging.TARGET_DPI)
+        result, cache_status = OCR_CACHE.get(cache_key)
+    if result is not None:
+        return result, cache_status
+
+    # Open the image, decoding oversized JPEGs at a reduced scale
+    with timer.span('open'):
+        image = imaging.open_image(image_bytes)
+
+    # Extract text from every page with the warm engines (or the binary),
+    # downscaling each page to the OCR target resolution first
+    page_texts = ocr.image_to_string_pages(
+        image, OCR_LANG, OCR_CONFIG, preprocess=imaging.normalize,
+        timer=timer)
+    result = {
+        'text': '\n'.join(page_texts),
+        'pages': [
+            {'page': number, 'text': text}
+            for number, text in enumerate(page_texts, start=1)
+        ],
+    }
+    OCR_CACHE.set(cache_key, result)
+    return result, cache_status
+
+
+def _extract_batch_item(index, image_bytes, timer=timing.NULL_TIMER):
+    if isinstance(image_bytes, Exception):
+        return {'index': index, 'status': 'error', 'error': str(image_bytes)}
+    try:
+        result, cache_status = extract_image(image_bytes, timer)
+    except Exception as e:
+        print(f"Batch image {index} failed: {type(e).__name__}: {str(e)}")
+        return {'index': index, 'status': 'error', 'error': str(e)}
+    return {
+        'index': index,
+        'status': 'success',
+        'text': result['text'],
+        'pages': result['pages'],
+        'cache': cache_status,
+    }
 
-        # Open the image using PIL
-        image = Image.open(io.BytesIO(image_bytes))
 
-        # Extract text using pytesseract
-        extracted_text = pytesseract.image_to_string(image)
+def extract_batch(images, timer=timing.NULL_TIMER):
+    """OCR a batch concurrently and return per-image results in input order.
 
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'text': extracted_text,
+    Images are coordinated on their own small pool, while their pages are
+    OCRed on the shared OCR pool, so the number of images decoded at once
+    (and the memory they hold) stays bounded by BATCH_CONCURRENCY.
+    """
+    global _batch_executor
+    if len(images) > MAX_BATCH_IMAGES:
+        raise ValueError(
+            f"A batch may contain at most {MAX_BATCH_IMAGES} images")
+    if _batch_executor is None:
+        _batch_executor = ThreadPoolExecutor(
+            max_workers=BATCH_CONCURRENCY, thread_name_prefix="batch")
+    return list(_batch_executor.map(
+        _extract_batch_item, range(len(images)), images,
+        [timer] * len(images)))
+
+
+def _json_response(status_code, body, timer):
+    with timer.span('serialize'):
+        body = json.dumps(body)
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Server-Timing': timer.server_timing(),
+        },
+        'body': body
+    }
+
+
+def _body_bytes(event):
+    """Size of the request body in bytes, as uploaded (before base64)."""
+    body = event.get('body')
+    if not body:
+        return 0
+    if isinstance(body, dict):
+        return len(json.dumps(body).encode('utf-8'))
+    if isinstance(body, bytes):
+        return len(body)
+    if event.get('isBase64Encoded'):
+        return len(body.rstrip('=')) * 3 // 4
+    return len(body.encode('utf-8'))
+
+
+def _print_metrics(event, timer, status, **properties):
+    print(json.dumps(timer.emf(
+        'extract',
+        status=status,
+        body_bytes=_body_bytes(event),
+        content_type=_header(event, 'content-type'),
+        **properties,
+    )))
+
+
+def lambda_handler(event, context):
+    timer = timing.Timer()
+    try:
+        with timer.span('decode'):
+            images, batch = parse_request(event)
+
+        if batch:
+            with timer.span('extract'):
+                results = extract_batch(images, timer)
+            response = _json_response(200, {
+                'results': results,
                 'status': 'success'
-            })
-        }
+            }, timer)
+
+            _print_metrics(
+                event, timer, 200,
+                images=len(results),
+                errors=sum(r['status'] == 'error' for r in results),
+            )
+            return response
+
+        image_bytes = images[0]
+        with timer.span('extract'):
+            result, cache_status = extract_image(image_bytes, timer)
+        response = _json_response(200, {
+            'text': result['text'],
+            'pages': result['pages'],
+            'cache': cache_status,
+            'status': 'success'
+        }, timer)
+
+        _print_metrics(
+            event, timer, 200,
+            image_bytes=len(image_bytes),
+            pages=len(result['pages']),
+            text_chars=len(result['text']),
+            cache=cache_status,
+        )
+        return response
 
     except Exception as e:
         error_details = {
@@ -130,15 +373,10 @@ def lambda_handler(event, context):
         if isinstance(e, subprocess.CalledProcessError):
             print(f"Command output: {e.output.decode()}")
 
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'error': str(e),
-                'error_details': error_details,
-                'status': 'error'
-            })
-        }
+        response = _json_response(500, {
+            'error': str(e),
+            'error_details': error_details,
+            'status': 'error'
+        }, timer)
+        _print_metrics(event, timer, 500, error_type=type(e).__name__)
+        return response
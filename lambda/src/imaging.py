@@ -0,0 +1,127 @@
+import importlib
+import io
+import os
+
+from PIL import Image
+
+# Pillow's Image.open falls back to Image.init(), which imports all ~40
+# format plugins the first time a container sees an image. By default only
+# the formats we accept are registered, so that never happens and anything
+# else is rejected as unidentified; IMAGE_PLUGINS=all keeps Pillow's
+# behaviour.
+IMAGE_PLUGINS = os.environ.get("IMAGE_PLUGINS", "accepted").lower()
+ACCEPTED_PLUGINS = (
+    "JpegImagePlugin",
+    "PngImagePlugin",
+    "TiffImagePlugin",
+    "WebPImagePlugin",
+    "BmpImagePlugin",
+)
+
+
+def register_plugins():
+    """Register the accepted formats, like Image.preinit(), and mark Pillow
+    fully initialized so Image.init() has nothing left to import."""
+    for name in ACCEPTED_PLUGINS:
+        importlib.import_module(f"PIL.{name}")
+    Image._initialized = 2
+
+
+if IMAGE_PLUGINS != "all":
+    register_plugins()
+
+# Tesseract is most accurate around 300 DPI; larger images only cost time.
+TARGET_DPI = int(os.environ.get("OCR_TARGET_DPI", "300"))
+
+# Without usable DPI metadata, assume the longest side spans a letter page.
+ASSUMED_PAGE_INCHES = 11.0
+
+# Reported DPI below this is treated as a placeholder (e.g. 72 from phones).
+MIN_TRUSTED_DPI = 100
+
+
+def estimate_dpi(image):
+    """Estimate the text resolution of a prescription image."""
+    dpi = image.info.get("dpi")
+    if dpi:
+        try:
+            value = float(dpi[0])
+        except (TypeError, ValueError, IndexError):
+            value = 0
+        if value >= MIN_TRUSTED_DPI:
+            return value
+    return max(image.size) / ASSUMED_PAGE_INCHES
+
+
+def _reduction_factor(dpi):
+    # PNG stores DPI as pixels per metre, so 600 comes back as 599.9988.
+    return max(1, int(dpi / TARGET_DPI + 0.01))
+
+
+def _set_dpi(image, dpi):
+    image.info["dpi"] = (dpi, dpi)
+
+
+def open_image(image_bytes):
+    """Open an image, letting JPEG decode at a reduced scale when oversized.
+
+    JPEG's draft() picks a DCT scale (1/2, 1/4, 1/8) during decoding, so the
+    full-size pixels are never materialized. It must run before load().
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    if image.format != "JPEG":
+        return image
+
+    dpi = estimate_dpi(image)
+    factor = _reduction_factor(dpi)
+    if factor > 1:
+        width, height = image.size
+        mode = "L" if image.mode in ("L", "RGB", "YCbCr") else image.mode
+        image.draft(mode, (width // factor, height // factor))
+        _set_dpi(image, dpi * image.size[0] / width)
+    return image
+
+
+def _is_grey_palette(image):
+    palette = image.getpalette() or []
+    return all(
+        palette[i] == palette[i + 1] == palette[i + 2]
+        for i in range(0, len(palette) - 2, 3))
+
+
+def to_8bit(image):
+    """Convert frames Image.reduce cannot average to 8-bit channels.
+
+    Bilevel scans (group 4 TIFF, fax) become greyscale, palette images
+    greyscale or RGB (keeping transparency as alpha), and 16-bit frames are
+    scaled by their brightest value rather than clipped to white, since
+    scanners often use only 10 or 12 of the 16 bits.
+    """
+    mode = image.mode
+    if mode == "1":
+        return image.convert("L")
+    if mode in ("P", "PA"):
+        grey = _is_grey_palette(image)
+        if mode == "PA" or "transparency" in image.info:
+            return image.convert("LA" if grey else "RGBA")
+        return image.convert("L" if grey else "RGB")
+    if mode == "I" or mode.startswith("I;16"):
+        image = image.convert("I")
+        brightest = image.getextrema()[1]
+        if brightest > 255:
+            scale = 255 / brightest
+            image = image.point(lambda value: value * scale + 0.5)
+        return image.convert("L")
+    return image
+
+
+def normalize(image):
+    """Downscale a decoded frame to roughly TARGET_DPI with Image.reduce."""
+    dpi = estimate_dpi(image)
+    image = to_8bit(image)
+    factor = _reduction_factor(dpi)
+    if factor > 1:
+        image = image.reduce(factor)
+        dpi /= factor
+    _set_dpi(image, dpi)
+    return image
@@ -0,0 +1,231 @@
+"""Durable job queues for asynchronous extract and standardize requests.
+
+JobQueue is the interface the job API and the worker use; SQLiteJobQueue
+implements it on a local SQLite file so one host can run the API and any
+number of worker processes against it. A managed queue (SQS plus a results
+table, say) plugs in by implementing the same methods and registering in
+QUEUES.
+
+A claimed job is leased to its worker for lease_seconds. A worker that dies
+leaves the lease to expire and the job is handed out again, up to
+max_attempts times. A job failed with retry is not handed out again until
+its delay has passed.
+"""
+import abc
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+FINISHED = (SUCCEEDED, FAILED)
+
+
+class JobQueue(abc.ABC):
+    """The operations the job API and workers need from a queue backend."""
+
+    @abc.abstractmethod
+    def submit(self, kind, payload):
+        """Enqueue a job and return its ID."""
+
+    @abc.abstractmethod
+    def claim(self):
+        """Lease the oldest runnable job as a dict, or return None."""
+
+    @abc.abstractmethod
+    def complete(self, job_id, result):
+        """Record the job's result."""
+
+    @abc.abstractmethod
+    def fail(self, job_id, error, retry=False, delay=0):
+        """Record an error; with retry the job is queued again, runnable
+        after delay seconds, if attempts remain."""
+
+    @abc.abstractmethod
+    def get(self, job_id):
+        """The job's status, result and error, or None if it is unknown."""
+
+
+class SQLiteJobQueue(JobQueue):
+    """JobQueue stored in a local SQLite file in WAL mode."""
+
+    def __init__(self, path, lease_seconds=300, max_attempts=3,
+                 retention=24 * 60 * 60):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retention = retention
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " result TEXT,"
+            " error TEXT,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " lease_expires_at REAL,"
+            " available_at REAL,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        columns = {
+            row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "available_at" not in columns:
+            # Queue files created before retry delays existed.
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN available_at REAL")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_runnable"
+            " ON jobs (status, created_at)")
+
+    def submit(self, kind, payload):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, payload, status, created_at,"
+                " updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), QUEUED, now, now),
+            )
+            self._prune(now)
+        return job_id
+
+    def claim(self):
+        now = time.time()
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock up front so two workers
+            # cannot select the same row.
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                while True:
+                    row = self._conn.execute(
+                        "SELECT id, kind, payload, attempts FROM jobs"
+                        " WHERE (status = ? AND (available_at IS NULL"
+                        " OR available_at <= ?))"
+                        " OR (status = ? AND lease_expires_at < ?)"
+                        " ORDER BY created_at LIMIT 1",
+                        (QUEUED, now, RUNNING, now),
+                    ).fetchone()
+                    if row is None:
+                        self._conn.execute("COMMIT")
+                        return None
+                    job_id, kind, payload, attempts = row
+                    if attempts < self.max_attempts:
+                        break
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, error = ?,"
+                        " lease_expires_at = NULL, updated_at = ?"
+                        " WHERE id = ?",
+                        (FAILED, "Job was abandoned by its workers", now,
+                         job_id),
+                    )
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1,"
+                    " lease_expires_at = ?, updated_at = ? WHERE id = ?",
+                    (RUNNING, now + self.lease_seconds, now, job_id),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return {
+            "id": job_id,
+            "kind": kind,
+            "payload": json.loads(payload),
+            "attempt": attempts + 1,
+        }
+
+    def complete(self, job_id, result):
+        self._finish(job_id, SUCCEEDED, result=json.dumps(result))
+
+    def fail(self, job_id, error, retry=False, delay=0):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT attempts FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if retry and row is not None and row[0] < self.max_attempts:
+                now = time.time()
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?,"
+                    " lease_expires_at = NULL, available_at = ?,"
+                    " updated_at = ? WHERE id = ?",
+                    (QUEUED, str(error), now + delay, now, job_id),
+                )
+                return
+        self._finish(job_id, FAILED, error=str(error))
+
+    def _finish(self, job_id, status, result=None, error=None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?,"
+                " lease_expires_at = NULL, updated_at = ? WHERE id = ?",
+                (status, result, error, time.time(), job_id),
+            )
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT kind, status, result, error, attempts, created_at,"
+                " updated_at FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        kind, status, result, error, attempts, created_at, updated_at = row
+        return {
+            "jobId": job_id,
+            "kind": kind,
+            "status": status,
+            "result": json.loads(result) if result is not None else None,
+            "error": error if status == FAILED else None,
+            "attempts": attempts,
+            "createdAt": created_at,
+            "updatedAt": updated_at,
+        }
+
+    def _prune(self, now):
+        if self.retention is None:
+            return
+        self._conn.execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+            (SUCCEEDED, FAILED, now - self.retention),
+        )
+
+
+def _sqlite_queue():
+    return SQLiteJobQueue(
+        os.environ.get("JOB_QUEUE_PATH", "/tmp/jobs.sqlite3"),
+        lease_seconds=float(os.environ.get("JOB_LEASE_SECONDS", "300")),
+        max_attempts=int(os.environ.get("JOB_MAX_ATTEMPTS", "3")),
+    )
+
+
+# JOB_QUEUE names one of these factories.
+QUEUES = {
+    "sqlite": _sqlite_queue,
+}
+
+_queue = None
+
+
+def get_queue():
+    """The process-wide queue selected by JOB_QUEUE (default "sqlite")."""
+    global _queue
+    if _queue is None:
+        name = os.environ.get("JOB_QUEUE", "sqlite").lower()
+        if name not in QUEUES:
+            raise ValueError(f"Unknown JOB_QUEUE: {name}")
+        _queue = QUEUES[name]()
+    return _queue
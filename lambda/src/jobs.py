@@ -0,0 +1,196 @@
+"""Asynchronous job API: submit, poll, and server-sent events.
+
+    POST /jobs[?kind=extract|standardize|pipeline]  -> 202 {"jobId", ...}
+    GET  /jobs/{id}                                 -> job status and result
+    GET  /jobs/{id}/events                          -> text/event-stream
+
+Submit bodies are the ones the synchronous endpoints take: an image (raw,
+multipart or JSON data URL) for extract and pipeline jobs, {"text": ...}
+for standardize jobs. Without ?kind, a JSON body with "text" is a
+standardize job and anything else a pipeline job. worker.py processes the
+queue.
+
+server.py mounts lambda_handler under /jobs and runs workers beside it. The
+default SQLite queue is a local file, so the API and its workers have to
+share a host; a Lambda deployment needs a shared backend in job_queue.QUEUES
+(each container has its own /tmp).
+"""
+import binascii
+import json
+import logging
+import os
+import time
+
+import extract
+import job_queue
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Python Lambda runtimes cannot stream, so the events endpoint collects
+# events for at most this long before returning; clients reconnect with the
+# same URL until a "done" event arrives.
+SSE_WAIT_SECONDS = float(os.environ.get("SSE_WAIT_SECONDS", "25"))
+SSE_POLL_INTERVAL = float(os.environ.get("SSE_POLL_INTERVAL", "0.5"))
+
+
+def _response(status_code, body):
+    return {
+        "statusCode": status_code,
+        "headers": {
+            "Content-Type": "application/json",
+            "Access-Control-Allow-Origin": "*",
+        },
+        "body": json.dumps(body),
+    }
+
+
+def _method_and_path(event):
+    """Request method and path from a Function URL or API Gateway event."""
+    http = (event.get("requestContext") or {}).get("http") or {}
+    method = http.get("method") or event.get("httpMethod") or "GET"
+    path = event.get("rawPath") or event.get("path") or "/"
+    return method.upper(), path.rstrip("/") or "/"
+
+
+def _content_type(event):
+    for key, value in (event.get("headers") or {}).items():
+        if key.lower() == "content-type":
+            return value.split(";")[0].strip().lower()
+    return ""
+
+
+def _json_body(event):
+    body = event.get("body") or ""
+    if event.get("isBase64Encoded"):
+        body = binascii.a2b_base64(body)
+    return json.loads(body)
+
+
+def _encode_images(images):
+    return [binascii.b2a_base64(image, newline=False).decode("ascii")
+            for image in images]
+
+
+def _job_payload(event):
+    """Work out the job kind and payload from a submit request."""
+    params = event.get("queryStringParameters") or {}
+    kind = params.get("kind")
+
+    if _content_type(event) == "application/json":
+        body = _json_body(event)
+        if kind is None:
+            kind = "standardize" if "text" in body else "pipeline"
+        if kind == "standardize":
+            if not isinstance(body.get("text"), str):
+                raise ValueError("text must be a string")
+            return kind, {"text": body["text"]}
+    elif kind == "standardize":
+        raise ValueError("Standardize jobs take a JSON body with text")
+
+    kind = kind or "pipeline"
+    if kind not in ("extract", "pipeline"):
+        raise ValueError(f"Unknown job kind: {kind}")
+
+    images, batch = extract.parse_request(event)
+    errors = [image for image in images if isinstance(image, Exception)]
+    if errors:
+        raise errors[0]
+    if batch and kind == "pipeline":
+        raise ValueError(
+            "Pipeline jobs take one image; submit batches as extract jobs")
+    return kind, {"images": _encode_images(images)}
+
+
+def submit(queue, event):
+    kind, payload = _job_payload(event)
+    job_id = queue.submit(kind, payload)
+    logger.info(f"Queued {kind} job {job_id}")
+    return _response(202, {
+        "jobId": job_id,
+        "kind": kind,
+        "status": job_queue.QUEUED,
+        "statusUrl": f"/jobs/{job_id}",
+        "eventsUrl": f"/jobs/{job_id}/events",
+    })
+
+
+def iter_events(queue, job_id, timeout=SSE_WAIT_SECONDS,
+                poll_interval=SSE_POLL_INTERVAL, sleep=time.sleep):
+    """Yield (event, data) pairs as the job changes status.
+
+    Ends with a "done" event once the job finishes, or after timeout
+    seconds without it (None waits indefinitely).
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    last_status = None
+    while True:
+        job = queue.get(job_id)
+        if job is None:
+            yield "error", {"jobId": job_id, "error": "Job not found"}
+            return
+        if job["status"] != last_status:
+            last_status = job["status"]
+            yield "status", {"jobId": job_id, "status": last_status}
+        if last_status in job_queue.FINISHED:
+            yield "done", job
+            return
+        if deadline is not None and time.monotonic() >= deadline:
+            return
+        sleep(poll_interval)
+
+
+def format_event(event, data):
+    """One server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def events_response(queue, job_id):
+    body = "".join(
+        format_event(event, data) for event, data in iter_events(
+            queue, job_id))
+    return {
+        "statusCode": 200,
+        "headers": {
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            "Access-Control-Allow-Origin": "*",
+        },
+        "body": body,
+    }
+
+
+def lambda_handler(event, context):
+    try:
+        queue = job_queue.get_queue()
+        method, path = _method_and_path(event)
+        parts = path.strip("/").split("/")
+
+        if parts[0] != "jobs":
+            return _response(404, {"error": "Not found", "status": "error"})
+
+        if method == "POST" and len(parts) == 1:
+            return submit(queue, event)
+
+        if method == "GET" and len(parts) == 2:
+            job = queue.get(parts[1])
+            if job is None:
+                return _response(
+                    404, {"error": "Job not found", "status": "error"})
+            return _response(200, job)
+
+        if method == "GET" and len(parts) == 3 and parts[2] == "events":
+            return events_response(queue, parts[1])
+
+        return _response(
+            405, {"error": "Method not allowed", "status": "error"})
+
+    except ValueError as e:
+        logger.error(f"Value error: {e}")
+        return _response(400, {"error": str(e), "status": "error"})
+    except Exception:
+        logger.error("Unexpected error occurred", exc_info=True)
+        return _response(500, {
+            "error": "An unexpected error occurred. Please check the logs.",
+            "status": "error",
+        })
@@ -0,0 +1,113 @@
+import json
+
+
+class ArrayParser:
+    """Incrementally parse a JSON array of objects as text arrives.
+
+    feed() returns the objects whose closing brace has been seen, so callers
+    can act on each element before the rest of the array is generated. Text
+    before the opening '[' (such as a code fence) is skipped, as is a
+    bracket in that text that does not open an array of objects
+    ("[1 found]").
+    """
+
+    def __init__(self):
+        self._started = False
+        self._finished = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._element = []
+        self._count = 0
+
+    @property
+    def started(self):
+        return self._started
+
+    @property
+    def finished(self):
+        return self._finished
+
+    def feed(self, chunk):
+        objects = []
+        for char in chunk:
+            if self._finished:
+                break
+            if not self._started:
+                if char == "[":
+                    self._started = True
+                continue
+
+            if self._depth > 0:
+                self._element.append(char)
+            elif self._count == 0 and char not in "{]," and \
+                    not char.isspace():
+                # Not an array of objects; look for the next '['.
+                self._started = char == "["
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 0:
+                    self._element = [char]
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 0 and char == "]":
+                    self._finished = True
+                    continue
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        objects.append(json.loads("".join(self._element)))
+                    finally:
+                        self._element = []
+                    self._count += 1
+        return objects
+
+
+def extract_array(text):
+    """Recover the JSON array of objects from model output.
+
+    Handles the plain array, a {"medications": [...]} object, and arrays
+    wrapped in code fences or surrounded by prose, trying each '[' until one
+    starts an array of objects. An empty array is only returned when no
+    non-empty one follows. Raises ValueError when no complete array can be
+    found.
+    """
+    try:
+        value = json.loads(text)
+    except ValueError:
+        value = None
+    if isinstance(value, list):
+        return value
+    if isinstance(value, dict) and isinstance(value.get("medications"), list):
+        return value["medications"]
+
+    decoder = json.JSONDecoder()
+    empty = None
+    start = text.find("[")
+    while start != -1:
+        try:
+            value, _ = decoder.raw_decode(text, start)
+        except ValueError:
+            value = None
+        if isinstance(value, list) and \
+                all(isinstance(item, dict) for item in value):
+            if value:
+                return value
+            if empty is None:
+                empty = value
+        start = text.find("[", start + 1)
+    if empty is None:
+        raise ValueError("No complete JSON array in the response")
+    return empty
@@ -0,0 +1,402 @@
+import ctypes
+import glob
+import io
+import logging
+import os
+import shlex
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytesseract
+from PIL import ImageSequence
+
+from timing import NULL_TIMER
+
+logger = logging.getLogger()
+
+TESSERACT_CMD = os.environ.get("TESSERACT_CMD", "/opt/bin/tesseract")
+TESSDATA_PREFIX = os.environ.get("TESSDATA_PREFIX", "/opt/lib/tessdata")
+TESSERACT_LIB_DIR = os.environ.get("TESSERACT_LIB_DIR", "/opt/lib")
+
+# "auto" uses the in-process engine when libtesseract can be loaded and falls
+# back to the tesseract binary otherwise; "subprocess" always forks.
+OCR_ENGINE = os.environ.get("OCR_ENGINE", "auto").lower()
+
+# How the subprocess path talks to the binary: "pipe" streams the encoded
+# image through stdin/stdout, "file" uses pytesseract's temp-file round trip.
+OCR_SUBPROCESS_IO = os.environ.get("OCR_SUBPROCESS_IO", "pipe").lower()
+
+DEFAULT_LANG = "eng"
+
+# Pages are spread across threads, so keep Tesseract itself single-threaded
+# rather than oversubscribing the vCPUs with OpenMP workers.
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+
+def available_cpus():
+    """Number of vCPUs this process may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+OCR_WORKERS = int(os.environ.get("OCR_WORKERS", "0")) or available_cpus()
+
+TSV_HEADER = (
+    "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\t"
+    "left\ttop\twidth\theight\tconf\ttext\n"
+)
+
+pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+
+
+class TesseractEngineError(RuntimeError):
+    """Raised when the in-process Tesseract engine cannot be used."""
+
+
+def _load_library():
+    """Load libtesseract from the layer, falling back to the system path."""
+    candidates = sorted(
+        glob.glob(os.path.join(TESSERACT_LIB_DIR, "libtesseract.so*")),
+        reverse=True,
+    )
+    candidates += ["libtesseract.so.5", "libtesseract.so.4", "libtesseract.so"]
+    for candidate in candidates:
+        try:
+            lib = ctypes.CDLL(candidate)
+        except OSError:
+            continue
+        try:
+            _declare_signatures(lib)
+        except AttributeError as e:
+            # A build missing part of the C API the engine needs.
+            logger.warning(f"Skipping {candidate}: {e}")
+            continue
+        logger.info(f"Loaded libtesseract from {candidate}")
+        return lib
+    raise TesseractEngineError("libtesseract could not be loaded")
+
+
+def _declare_signatures(lib):
+    handle = ctypes.c_void_p
+    text = ctypes.POINTER(ctypes.c_char)
+
+    lib.TessVersion.restype = ctypes.c_char_p
+    lib.TessVersion.argtypes = []
+    lib.TessBaseAPICreate.restype = handle
+    lib.TessBaseAPICreate.argtypes = []
+    lib.TessBaseAPIInit3.restype = ctypes.c_int
+    lib.TessBaseAPIInit3.argtypes = [handle, ctypes.c_char_p, ctypes.c_char_p]
+    lib.TessBaseAPISetVariable.restype = ctypes.c_int
+    lib.TessBaseAPISetVariable.argtypes = [
+        handle, ctypes.c_char_p, ctypes.c_char_p]
+    lib.TessBaseAPISetPageSegMode.restype = None
+    lib.TessBaseAPISetPageSegMode.argtypes = [handle, ctypes.c_int]
+    lib.TessBaseAPISetImage.restype = None
+    lib.TessBaseAPISetImage.argtypes = [
+        handle, ctypes.c_char_p, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+        ctypes.c_int]
+    lib.TessBaseAPISetSourceResolution.restype = None
+    lib.TessBaseAPISetSourceResolution.argtypes = [handle, ctypes.c_int]
+    lib.TessBaseAPIGetUTF8Text.restype = text
+    lib.TessBaseAPIGetUTF8Text.argtypes = [handle]
+    if has_tsv(lib):
+        lib.TessBaseAPIGetTsvText.restype = text
+        lib.TessBaseAPIGetTsvText.argtypes = [handle, ctypes.c_int]
+    lib.TessBaseAPIClear.restype = None
+    lib.TessBaseAPIClear.argtypes = [handle]
+    lib.TessBaseAPIEnd.restype = None
+    lib.TessBaseAPIEnd.argtypes = [handle]
+    lib.TessBaseAPIDelete.restype = None
+    lib.TessBaseAPIDelete.argtypes = [handle]
+    lib.TessDeleteText.restype = None
+    lib.TessDeleteText.argtypes = [text]
+
+
+def has_tsv(lib):
+    """Whether lib can produce TSV word data.
+
+    GetTsvText is 3.05+; the EPEL7 layer ships 3.04, whose engines still
+    serve image_to_string() while image_to_data() uses the binary.
+    """
+    return hasattr(lib, "TessBaseAPIGetTsvText")
+
+
+def _parse_config(config):
+    """Split a pytesseract-style config string into a PSM and variables."""
+    psm = None
+    variables = []
+    args = shlex.split(config or "")
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg in ("--psm", "-psm") and i + 1 < len(args):
+            psm = int(args[i + 1])
+            i += 2
+            continue
+        if arg == "-c" and i + 1 < len(args):
+            name, _, value = args[i + 1].partition("=")
+            variables.append((name, value))
+            i += 2
+            continue
+        if arg.startswith("--oem"):
+            # The engine mode is fixed at Init3 time; the default is fine.
+            i += 1 if "=" in arg else 2
+            continue
+        raise TesseractEngineError(f"Unsupported config option: {arg}")
+    return psm, variables
+
+
+def engine_image(image):
+    """An L or RGB image for TessBaseAPISetImage.
+
+    Transparent pixels are composited onto white by pytesseract's prepare(),
+    as for the binary; a plain convert() would turn them black.
+    """
+    if "A" in image.getbands():
+        image, _ = pytesseract.pytesseract.prepare(image)
+    if image.mode not in ("L", "RGB"):
+        image = image.convert("RGB")
+    return image
+
+
+class TesseractEngine:
+    """A TessBaseAPI kept alive so the traineddata is loaded only once."""
+
+    def __init__(self, lib, lang=DEFAULT_LANG, config=""):
+        self._lib = lib
+        self._lock = threading.Lock()
+        self.supports_tsv = has_tsv(lib)
+        self._handle = lib.TessBaseAPICreate()
+        if lib.TessBaseAPIInit3(
+                self._handle, TESSDATA_PREFIX.encode(), lang.encode()) != 0:
+            lib.TessBaseAPIDelete(self._handle)
+            raise TesseractEngineError(
+                f"Failed to initialise Tesseract for language '{lang}'")
+
+        try:
+            psm, variables = _parse_config(config)
+            if psm is not None:
+                lib.TessBaseAPISetPageSegMode(self._handle, psm)
+            for name, value in variables:
+                if not lib.TessBaseAPISetVariable(
+                        self._handle, name.encode(), value.encode()):
+                    raise TesseractEngineError(f"Unknown variable: {name}")
+        except BaseException:
+            self.close()
+            raise
+
+    def _recognize(self, image, getter, *args):
+        image = engine_image(image)
+        bytes_per_pixel = 1 if image.mode == "L" else 3
+        width, height = image.size
+        data = image.tobytes()
+
+        with self._lock:
+            self._lib.TessBaseAPISetImage(
+                self._handle, data, width, height, bytes_per_pixel,
+                width * bytes_per_pixel)
+            dpi = image.info.get("dpi")
+            if dpi:
+                self._lib.TessBaseAPISetSourceResolution(
+                    self._handle, int(round(dpi[0])))
+            result = getter(self._handle, *args)
+            try:
+                if not result:
+                    raise TesseractEngineError("Tesseract returned no text")
+                return ctypes.string_at(result).decode("utf-8")
+            finally:
+                if result:
+                    self._lib.TessDeleteText(result)
+                self._lib.TessBaseAPIClear(self._handle)
+
+    def image_to_string(self, image):
+        return self._recognize(image, self._lib.TessBaseAPIGetUTF8Text)
+
+    def image_to_data(self, image):
+        if not self.supports_tsv:
+            raise TesseractEngineError(
+                "This libtesseract cannot produce TSV output")
+        return TSV_HEADER + self._recognize(
+            image, self._lib.TessBaseAPIGetTsvText, 0)
+
+    def close(self):
+        with self._lock:
+            if self._handle:
+                self._lib.TessBaseAPIEnd(self._handle)
+                self._lib.TessBaseAPIDelete(self._handle)
+                self._handle = None
+
+
+_lib = None
+_lib_error = None
+_lib_lock = threading.Lock()
+# TessBaseAPI is not thread-safe, so every pool thread keeps its own engines.
+_local = threading.local()
+
+
+def _get_lib():
+    global _lib, _lib_error
+    with _lib_lock:
+        if _lib is None and _lib_error is None:
+            try:
+                _lib = _load_library()
+            except TesseractEngineError as e:
+                _lib_error = e
+                logger.warning(f"In-process Tesseract unavailable: {e}")
+        return _lib
+
+
+def get_engine(lang=DEFAULT_LANG, config=""):
+    """Return this thread's engine for lang/config, or None if unavailable.
+
+    Engines are created on first use and then reused by every warm invocation
+    of the container.
+    """
+    if OCR_ENGINE == "subprocess" or _lib_error is not None:
+        return None
+
+    engines = getattr(_local, "engines", None)
+    if engines is None:
+        engines = _local.engines = {}
+
+    key = (lang, config)
+    engine = engines.get(key)
+    if engine is not None:
+        return engine
+
+    lib = _get_lib()
+    if lib is None:
+        return None
+    try:
+        engine = TesseractEngine(lib, lang, config)
+    except TesseractEngineError as e:
+        logger.warning(f"In-process Tesseract unavailable: {e}")
+        return None
+    engines[key] = engine
+    return engine
+
+
+def encode_image(image):
+    """Encode an image for tesseract's stdin, without touching the disk.
+
+    Uses pytesseract's prepare() so alpha handling matches the file path, and
+    a fast PNG compression level since the bytes only cross a pipe.
+    """
+    image, _ = pytesseract.pytesseract.prepare(image)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", compress_level=1)
+    return buffer.getvalue()
+
+
+def run_tesseract(image_bytes, extension="", lang=DEFAULT_LANG, config="",
+                  timeout=0):
+    """Run `tesseract stdin stdout` on encoded image bytes and return stdout."""
+    cmd_args = [TESSERACT_CMD, "stdin", "stdout"]
+    if lang is not None:
+        cmd_args += ["-l", lang]
+    if config:
+        cmd_args += shlex.split(config)
+    if extension and extension != "txt":
+        cmd_args.append(extension)
+
+    try:
+        proc = subprocess.run(
+            cmd_args,
+            input=image_bytes,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=timeout or None,
+        )
+    except FileNotFoundError:
+        raise pytesseract.TesseractNotFoundError()
+    except subprocess.TimeoutExpired:
+        raise RuntimeError("Tesseract process timeout")
+
+    if proc.returncode:
+        raise pytesseract.TesseractError(
+            proc.returncode, pytesseract.pytesseract.get_errors(proc.stderr))
+    return proc.stdout
+
+
+def run_and_get_output(image, extension="", lang=DEFAULT_LANG, config="",
+                       timeout=0, return_bytes=False, timer=NULL_TIMER):
+    """Subprocess OCR through pipes, or through temp files in "file" mode."""
+    if OCR_SUBPROCESS_IO == "file":
+        # pytesseract saves, runs and reads back in one call.
+        with timer.span("tesseract_file"):
+            return pytesseract.run_and_get_output(
+                image, extension, lang, config, timeout=timeout,
+                return_bytes=return_bytes)
+
+    with timer.span("encode"):
+        image_bytes = encode_image(image)
+    with timer.span("tesseract"):
+        output = run_tesseract(image_bytes, extension, lang, config, timeout)
+    if return_bytes:
+        return output
+    return output.decode("utf-8")
+
+
+def image_to_string(image, lang=DEFAULT_LANG, config="", timer=NULL_TIMER):
+    """OCR an image to text, preferring the in-process engine."""
+    engine = get_engine(lang, config)
+    if engine is not None:
+        with timer.span("tesseract"):
+            return engine.image_to_string(image)
+    return run_and_get_output(image, "txt", lang, config, timer=timer)
+
+
+def image_to_data(image, lang=DEFAULT_LANG, config=""):
+    """OCR an image to Tesseract's TSV word data, preferring the engine."""
+    engine = get_engine(lang, config)
+    if engine is not None and engine.supports_tsv:
+        return engine.image_to_data(image)
+    return run_and_get_output(image, "tsv", lang, config)
+
+
+_executor = None
+
+
+def _mark_ocr_thread():
+    _local.ocr_thread = True
+
+
+def get_executor():
+    """The container-wide OCR thread pool, sized to the available vCPUs."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=OCR_WORKERS, thread_name_prefix="ocr",
+            initializer=_mark_ocr_thread)
+    return _executor
+
+
+def iter_frames(image):
+    """Yield an independent copy of every frame of a (multi-page) image."""
+    for frame in ImageSequence.Iterator(image):
+        yield frame.copy()
+
+
+def image_to_string_pages(image, lang=DEFAULT_LANG, config="",
+                          preprocess=None, timer=NULL_TIMER):
+    """OCR every frame of an image concurrently, returning texts in order.
+
+    preprocess, if given, is applied to each frame on the worker thread.
+    Stage times on timer are summed over the pages. Even a single page is
+    OCRed on the pool, so request and batch threads never build engines of
+    their own and the container holds at most OCR_WORKERS of them.
+    """
+    def run(frame):
+        if preprocess is not None:
+            with timer.span("preprocess"):
+                frame = preprocess(frame)
+        return image_to_string(frame, lang, config, timer)
+
+    frames = list(iter_frames(image))
+    if len(frames) == 1 and getattr(_local, "ocr_thread", False):
+        # Already on the pool; waiting on it from here could deadlock.
+        return [run(frames[0])]
+    return list(get_executor().map(run, frames))
@@ -0,0 +1,106 @@
+"""Extract and standardize in a single invocation.
+
+The front end otherwise sends the OCR text back through the Next.js server
+to the standardize function, paying for a second round trip, cold start and
+TLS handshake. This handler accepts the same bodies as the extract function
+(one image) and returns the raw text together with the medications. The
+extract and standardize functions are unchanged.
+"""
+import json
+import logging
+import os
+
+import extract
+import standardize
+import timing
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+def _response(status_code, body, timer):
+    return {
+        "statusCode": status_code,
+        "headers": {
+            "Content-Type": "application/json",
+            "Access-Control-Allow-Origin": "*",
+            "Server-Timing": timer.server_timing(),
+        },
+        "body": json.dumps(body),
+    }
+
+
+def run_pipeline(image_bytes, api_key, deadline=None,
+                 timer=timing.NULL_TIMER):
+    """OCR one image and standardize its text, returning the response body."""
+    with timer.span("ocr"):
+        result, ocr_cache = extract.extract_image(image_bytes, timer)
+
+    body = {
+        "rawText": result["text"],
+        "pages": result["pages"],
+        "cache": {"ocr": ocr_cache, "standardize": False},
+        "status": "success",
+    }
+
+    if not result["text"].strip():
+        body.update(success=False, noContent=True, medications=[],
+                    error="No text could be extracted from the image")
+        return body
+
+    text, corrections, classification = standardize.prepare_text(
+        result["text"], timer)
+    body["prefilter"] = classification
+    body["corrections"] = standardize.corrections_body(corrections)
+
+    if classification is not None and \
+            classification["decision"] == "no_medication":
+        medications = []
+    else:
+        standardized_text, cached = standardize.standardize_cached(
+            text, api_key, deadline, timer)
+        medications = standardized_text["medications"]
+        body["cache"]["standardize"] = cached
+
+    body["medications"] = medications
+    body["success"] = bool(medications)
+    if not medications:
+        body.update(
+            noMedications=True,
+            error="No medications or SIG codes could be identified in the text")
+    return body
+
+
+def lambda_handler(event, context):
+    timer = timing.Timer()
+    try:
+        api_key = os.environ.get("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError(
+                "OpenAI API key not found in environment variables")
+
+        # Take the deadline before OCR so standardization gets what is left.
+        deadline = standardize.request_deadline(context)
+
+        with timer.span("decode"):
+            images, batch = extract.parse_request(event)
+        if batch:
+            raise ValueError(
+                "The pipeline takes one image; send batches to extract")
+
+        body = run_pipeline(images[0], api_key, deadline, timer)
+        response = _response(200, body, timer)
+        print(json.dumps(timer.emf(
+            "pipeline",
+            image_bytes=len(images[0]),
+            pages=len(body["pages"]),
+            text_chars=len(body["rawText"]),
+            medications=len(body["medications"]),
+        )))
+        return response
+
+    except Exception as e:
+        response = standardize.error_response(e)
+        response["headers"]["Server-Timing"] = timer.server_timing()
+        print(json.dumps(timer.emf("pipeline", status=response["statusCode"])))
+        return response
@@ -0,0 +1,70 @@
+"""A cheap local check for whether OCR text can contain a prescription.
+
+Insurance cards, receipts and blank OCR output are answered locally instead
+of paying for a model call that can only return null medications. Only text
+with no signal at all is skipped: the drug lexicon is small, so a missing
+drug name never counts against text that has directions or a dose.
+"""
+import os
+import re
+
+import drug_lexicon
+import sig_rules
+
+DOSE_RE = re.compile(
+    r"\b\d+(?:\.\d+)?\s*(?:mg|mcg|µg|g|ml|units?|iu|meq)\b", re.IGNORECASE)
+
+# Directions vocabulary: every form, route and frequency the SIG rules know,
+# plus verbs, abbreviations and label words.
+SIG_TERMS = (
+    set(sig_rules.FORMS) | set(sig_rules.ROUTES)
+    | set(sig_rules.FIXED_FREQUENCIES) | {
+        "take", "inhale", "apply", "instill", "inject",
+        "insert", "chew", "twice", "as needed", "prn", "bid", "tid", "qid",
+        "qd", "qhs", "qam", "qpm", "qod", "nostril", "nostrils", "eye",
+        "eyes", "ear", "ears", "refill", "refills", "qty", "sig", "disp",
+        "dispense",
+    }
+)
+
+SIG_TERM_RE = re.compile(
+    r"\b(?:every\s+\d+\s+hours?|q\d+h|" + "|".join(
+        re.escape(term).replace(r"\ ", r"\s+")
+        for term in sorted(SIG_TERMS, key=len, reverse=True)) + r")\b",
+    re.IGNORECASE,
+)
+
+# Feature weights; a score at or above PREFILTER_THRESHOLD goes to the model.
+DRUG_WEIGHT = 2.0
+DOSE_WEIGHT = 1.5
+SIG_TERM_WEIGHT = 0.5
+
+# By default a single directions term is enough to call the model.
+PREFILTER_THRESHOLD = float(os.environ.get("PREFILTER_THRESHOLD", "0.5"))
+
+
+def classify(text):
+    """Score text for medication content.
+
+    Returns a dict with the decision ("medication" or "no_medication"), the
+    score, the threshold and the feature counts, so the weights can be tuned
+    from the logs.
+    """
+    drugs = drug_lexicon.find_drugs(text)
+    doses = DOSE_RE.findall(text)
+    sig_terms = SIG_TERM_RE.findall(text)
+
+    score = (
+        DRUG_WEIGHT * len(drugs)
+        + DOSE_WEIGHT * len(doses)
+        + SIG_TERM_WEIGHT * len(sig_terms)
+    )
+    return {
+        "decision": (
+            "medication" if score >= PREFILTER_THRESHOLD else "no_medication"),
+        "score": score,
+        "threshold": PREFILTER_THRESHOLD,
+        "drugs": len(drugs),
+        "doses": len(doses),
+        "sig_terms": len(sig_terms),
+    }
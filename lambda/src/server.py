@@ -0,0 +1,407 @@
+"""Self-hosted ASGI server for the extract and standardize handlers.
+
+    uvicorn server:app --host 0.0.0.0 --port 8000    (or: python server.py)
+
+POST /extract and POST /standardize take the same requests as the two
+Function URLs. Requests are converted to the Lambda event shape, so the
+handlers behave exactly as they do on Lambda. OCR runs in a process pool
+with one process per core. Standardization runs on the server's event loop
+with the async OpenAI client; stream-mode requests get their NDJSON lines as
+each medication is parsed, rather than buffered as on Lambda.
+
+The job API (POST /jobs, GET /jobs/{id}, GET /jobs/{id}/events) is served
+from here too, with JOB_WORKERS worker threads draining the queue in this
+process; more can run as worker.py against the same JOB_QUEUE_PATH.
+
+Each route admits a bounded number of requests at once (queued plus
+running); beyond that the server answers 429 with Retry-After instead of
+letting the backlog grow until requests time out.
+"""
+import asyncio
+import base64
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import parse_qsl
+
+# The pool already runs one process per core, so each process OCRs its
+# pages on a single thread. Set before extract is imported here or in the
+# pool's processes.
+os.environ.setdefault("OCR_WORKERS", "1")
+
+import extract  # noqa: E402
+import job_queue  # noqa: E402
+import jobs  # noqa: E402
+import ocr  # noqa: E402
+import standardize  # noqa: E402
+import timing  # noqa: E402
+import worker  # noqa: E402
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+SERVER_HOST = os.environ.get("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.environ.get("SERVER_PORT", "8000"))
+
+OCR_PROCESSES = int(os.environ.get("OCR_PROCESSES", "0")) or \
+    ocr.available_cpus()
+
+# Requests admitted per route before new ones get 429.
+MAX_PENDING_OCR = int(
+    os.environ.get("MAX_PENDING_OCR", "0")) or OCR_PROCESSES * 4
+MAX_PENDING_STANDARDIZE = int(
+    os.environ.get("MAX_PENDING_STANDARDIZE", "64"))
+# Job API requests hold a thread, for up to SSE_WAIT_SECONDS for events.
+MAX_PENDING_JOBS = int(os.environ.get("MAX_PENDING_JOBS", "16"))
+
+# Worker threads started with the server; 0 leaves the queue to worker.py.
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "1"))
+
+MAX_BODY_BYTES = int(os.environ.get("MAX_BODY_BYTES", str(20 * 1024 * 1024)))
+
+# Time a standardize request may spend waiting on OpenAI, standing in for
+# the Lambda's remaining time.
+REQUEST_TIMEOUT = float(os.environ.get("REQUEST_TIMEOUT", "60"))
+
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+    "Access-Control-Allow-Headers": "*",
+}
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+class Admission:
+    """Counts requests in a route and refuses them past a limit.
+
+    Only touched from the event loop, so no lock is needed.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+
+    def try_enter(self):
+        if self.active >= self.limit:
+            return False
+        self.active += 1
+        return True
+
+    def leave(self):
+        self.active -= 1
+
+
+_pool = None
+
+
+def get_pool():
+    """The OCR process pool, started on first use."""
+    global _pool
+    if _pool is None:
+        # spawn rather than fork: the server's event loop and OpenAI
+        # connections must not be copied into the workers.
+        _pool = ProcessPoolExecutor(
+            max_workers=OCR_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=importlib.import_module,
+            initargs=("extract",),
+        )
+    return _pool
+
+
+def shutdown_pool():
+    """Stop the OCR pool, waiting for running OCR to drain; blocks, so
+    request handlers call it in a thread. The next get_pool() starts a
+    fresh pool meanwhile."""
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+_jobs_executor = None
+
+
+def get_jobs_executor():
+    """Threads for the job API, which blocks on SQLite and on SSE polls.
+
+    Kept apart from the loop's default executor (used by stream-mode
+    standardize), so event streams cannot starve other routes; admission
+    already caps the job API at MAX_PENDING_JOBS requests.
+    """
+    global _jobs_executor
+    if _jobs_executor is None:
+        _jobs_executor = ThreadPoolExecutor(
+            max_workers=MAX_PENDING_JOBS, thread_name_prefix="jobs-api")
+    return _jobs_executor
+
+
+def shutdown_jobs_executor():
+    global _jobs_executor
+    executor, _jobs_executor = _jobs_executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+_job_stop = threading.Event()
+_job_threads = []
+
+
+def start_job_workers():
+    _job_stop.clear()
+    queue = job_queue.get_queue()
+    for i in range(JOB_WORKERS):
+        thread = threading.Thread(
+            target=worker.run_worker, args=(queue,),
+            kwargs={"stop": _job_stop}, name=f"job-worker-{i}", daemon=True)
+        thread.start()
+        _job_threads.append(thread)
+
+
+def stop_job_workers():
+    _job_stop.set()
+    while _job_threads:
+        _job_threads.pop().join()
+
+
+def lambda_event(scope, body):
+    """A Function URL (payload v2) event for an ASGI request."""
+    headers = {}
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").lower()
+        value = value.decode("latin-1")
+        headers[name] = f"{headers[name]},{value}" if name in headers \
+            else value
+
+    query = scope.get("query_string", b"").decode("latin-1")
+    event = {
+        "version": "2.0",
+        "rawPath": scope["path"],
+        "rawQueryString": query,
+        "queryStringParameters": dict(parse_qsl(query)) or None,
+        "headers": headers,
+        "requestContext": {
+            "http": {"method": scope["method"], "path": scope["path"]},
+        },
+    }
+
+    # Like Function URLs: text bodies as strings, anything else base64.
+    media_type = headers.get("content-type", "").split(";")[0].strip()
+    if media_type.startswith("text/") or media_type == "application/json":
+        try:
+            event.update(body=body.decode("utf-8"), isBase64Encoded=False)
+            return event
+        except UnicodeDecodeError:
+            pass
+    event.update(
+        body=base64.b64encode(body).decode("ascii"), isBase64Encoded=True)
+    return event
+
+
+async def handle_extract(event):
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(
+            get_pool(), extract.lambda_handler, event, None)
+    except BrokenProcessPool:
+        logger.error("OCR process pool broke; restarting it")
+        await loop.run_in_executor(None, shutdown_pool)
+        return _json_response(
+            503, {"error": "OCR worker crashed", "status": "error"})
+
+
+async def handle_standardize(event):
+    deadline = time.monotonic() + REQUEST_TIMEOUT - \
+        standardize.OPENAI_DEADLINE_MARGIN
+    timer = timing.Timer()
+    try:
+        response = await standardize.handle_request_async(
+            event, deadline, timer, stream_body=True)
+    except Exception as e:
+        response = standardize.error_response(e)
+    response.setdefault("headers", {})["Server-Timing"] = \
+        timer.server_timing()
+    return response
+
+
+async def handle_jobs(event):
+    # The job API blocks on SQLite and while polling for events.
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_jobs_executor(), jobs.lambda_handler, event, None)
+
+
+# path: (handler, admission, methods)
+ROUTES = {
+    "/extract": (handle_extract, Admission(MAX_PENDING_OCR), ("POST",)),
+    "/standardize": (
+        handle_standardize, Admission(MAX_PENDING_STANDARDIZE), ("POST",)),
+    "/jobs": (handle_jobs, Admission(MAX_PENDING_JOBS), ("GET", "POST")),
+}
+
+
+def _route(path):
+    """The ROUTES key for a request path; /jobs/{id}... goes to /jobs."""
+    if path.startswith("/jobs/"):
+        return "/jobs"
+    return path
+
+
+def _json_response(status_code, body, headers=None):
+    return {
+        "statusCode": status_code,
+        "headers": {"Content-Type": "application/json", **(headers or {})},
+        "body": json.dumps(body),
+    }
+
+
+async def _read_body(receive):
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise BodyTooLarge()
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+async def _send(send, response):
+    """Send a Lambda-style response dict.
+
+    A body that is an iterator of strings (streamed NDJSON) is sent one
+    chunk per message as the iterator produces them.
+    """
+    body = response.get("body") or ""
+    if response.get("isBase64Encoded"):
+        body = base64.b64decode(body)
+    elif isinstance(body, str):
+        body = body.encode("utf-8")
+
+    headers = {**CORS_HEADERS, **(response.get("headers") or {})}
+    await send({
+        "type": "http.response.start",
+        "status": response.get("statusCode", 200),
+        "headers": [
+            (name.lower().encode("latin-1"), str(value).encode("latin-1"))
+            for name, value in headers.items()
+        ],
+    })
+    if not isinstance(body, bytes):
+        await _send_chunks(send, body)
+        return
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_chunks(send, chunks):
+    # The iterator blocks (on the OpenAI stream), so advance it in a thread.
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            chunk = await loop.run_in_executor(None, next, chunks, None)
+            if chunk is None:
+                break
+            await send({
+                "type": "http.response.body",
+                "body": chunk.encode("utf-8"),
+                "more_body": True,
+            })
+    finally:
+        await loop.run_in_executor(None, chunks.close)
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            get_pool()
+            start_job_workers()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            stop_job_workers()
+            shutdown_jobs_executor()
+            shutdown_pool()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    path = scope["path"].rstrip("/") or "/"
+    if path == "/health":
+        await _send(send, _json_response(200, {
+            "status": "ok",
+            "pending": {
+                route: admission.active
+                for route, (_, admission, _) in ROUTES.items()
+            },
+        }))
+        return
+
+    route = _route(path)
+    if route not in ROUTES:
+        await _send(send, _json_response(
+            404, {"error": "Not found", "status": "error"}))
+        return
+    handler, admission, methods = ROUTES[route]
+    if scope["method"] == "OPTIONS":
+        await _send(send, {"statusCode": 204, "body": ""})
+        return
+    if scope["method"] not in methods:
+        await _send(send, _json_response(
+            405, {"error": "Method not allowed", "status": "error"}))
+        return
+
+    if not admission.try_enter():
+        logger.info(f"Rejecting {path}: {admission.active} requests pending")
+        await _send(send, _json_response(
+            429, {"error": "Server busy, retry shortly", "status": "error"},
+            {"Retry-After": "1"}))
+        return
+
+    # Streamed responses do their work while being sent, so the request
+    # stays admitted until the last byte is out.
+    try:
+        try:
+            body = await _read_body(receive)
+        except BodyTooLarge:
+            response = _json_response(
+                413, {"error": "Request body too large", "status": "error"})
+        else:
+            response = await handler(lambda_event(scope, body))
+        await _send(send, response)
+    finally:
+        admission.leave()
+
+
+def main():
+    import uvicorn
+
+    logging.basicConfig(level=logging.INFO)
+    # One server process: the OCR pool provides the parallelism.
+    uvicorn.run(app, host=SERVER_HOST, port=SERVER_PORT)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""Rule-based SIG parsing for routine prescription phrasing.
+
+Lines such as "Take 1 tablet by mouth every 8 hours" are parsed with
+compiled patterns into the same medication objects the LLM returns. A block
+is only accepted when every line in it is understood; anything else is left
+for the model.
+"""
+import re
+
+# Bump when the rules change what they produce, so cached results refresh.
+RULES_VERSION = "2"
+
+STRENGTH_UNITS = r"(?:mg|mcg|g|ml|units?|iu|meq|%)"
+
+FORMS = {
+    "tablet": "TAB", "tablets": "TAB", "tab": "TAB", "tabs": "TAB",
+    "capsule": "CAP", "capsules": "CAP", "cap": "CAP", "caps": "CAP",
+    "puff": "PUFF", "puffs": "PUFF",
+    "drop": "GTT", "drops": "GTT",
+    "ml": "ML", "milliliter": "ML", "milliliters": "ML",
+    "teaspoon": "TSP", "teaspoons": "TSP", "teaspoonful": "TSP",
+    "tablespoon": "TBSP", "tablespoons": "TBSP",
+    "patch": "PATCH", "patches": "PATCH",
+    "spray": "SPRAY", "sprays": "SPRAY",
+    "unit": "UNITS", "units": "UNITS",
+    "suppository": "SUPP", "suppositories": "SUPP",
+}
+
+ROUTES = {
+    "by mouth": "PO", "orally": "PO", "po": "PO", "oral": "PO",
+    "sublingually": "SL", "under the tongue": "SL",
+    "topically": "TOP", "to the skin": "TOP",
+    "by inhalation": "INH", "inhaled": "INH",
+    "subcutaneously": "SUBQ", "under the skin": "SUBQ",
+    "intramuscularly": "IM",
+    "rectally": "PR",
+    "in each eye": "OU", "in both eyes": "OU",
+    "in the right eye": "OD", "in the left eye": "OS",
+    "in each nostril": "NASAL", "nasally": "NASAL",
+}
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "half": 0.5, "one-half": 0.5, "1/2": 0.5, "½": 0.5,
+}
+
+TIMES_PER_DAY = {
+    "once": "QD", "1": "QD", "one": "QD",
+    "twice": "BID", "2": "BID", "two": "BID",
+    "three": "TID", "3": "TID",
+    "four": "QID", "4": "QID",
+}
+
+FIXED_FREQUENCIES = {
+    "daily": "QD", "once daily": "QD", "once a day": "QD",
+    "every day": "QD", "each day": "QD", "every morning": "QAM",
+    "in the morning": "QAM", "every evening": "QPM",
+    "in the evening": "QPM", "at bedtime": "QHS", "every night": "QHS",
+    "nightly": "QHS", "every other day": "QOD", "weekly": "QWK",
+    "once weekly": "QWK", "once a week": "QWK", "every week": "QWK",
+}
+
+
+# Verbs that open a directions line, never a drug name.
+SIG_VERBS = (
+    "take", "give", "inhale", "apply", "instill", "use", "inject", "insert",
+    "place", "chew",
+)
+
+
+def _alternation(words):
+    """Regex alternation that tries longer phrases first."""
+    return "|".join(
+        re.escape(w) for w in sorted(words, key=len, reverse=True))
+
+
+MEDICATION_RE = re.compile(
+    r"^(?:rx\s*[:.#]?\s*)?"
+    r"(?!(?:" + _alternation(SIG_VERBS) + r"|sig|qty|quantity|disp|dispense"
+    r"|refills?)\b)"
+    r"(?P<name>[a-z][a-z\-]*(?:\s+[a-z][a-z\-]*){0,3}?)\s+"
+    r"(?P<strength>\d+(?:\.\d+)?(?:\s*/\s*\d+(?:\.\d+)?)?\s*"
+    + STRENGTH_UNITS + r"(?:\s*/\s*\d*\.?\d*\s*ml)?)"
+    r"(?:\s+(?P<form>" + _alternation(FORMS) + r"))?"
+    r"\s*(?P<rest>[,:;\-–]\s*.*)?$",
+    re.IGNORECASE,
+)
+
+SIG_RE = re.compile(
+    r"^(?:sig\s*[:.]?\s*)?"
+    r"(?:" + _alternation(SIG_VERBS) + r")\s+"
+    r"(?P<count>\d+(?:\.\d+)?|" + _alternation(NUMBER_WORDS) + r")\s+"
+    r"(?P<form>" + _alternation(FORMS) + r")\s+"
+    r"(?:(?P<route>" + _alternation(ROUTES) + r")\s+)?"
+    r"(?P<frequency>"
+    r"every\s+(?P<hours>\d+)\s+hours?"
+    r"|(?P<times>" + _alternation(TIMES_PER_DAY) + r")\s+(?:times?\s+)?"
+    r"(?:daily|a\s+day|per\s+day)"
+    r"|" + _alternation(FIXED_FREQUENCIES) + r")"
+    r"(?P<prn>\s+as\s+needed(?:\s+for\s+(?P<prn_for>[a-z ]+?))?)?"
+    r"(?:\s+(?P<with_food>with\s+(?:food|meals)))?"
+    r"(?:\s+for\s+(?P<days>\d+)\s+days?)?"
+    r"(?:\s+for\s+(?P<purpose>[a-z][a-z ]*?))?"
+    r"\s*\.?$",
+    re.IGNORECASE,
+)
+
+QUANTITY_RE = re.compile(
+    r"(?:qty|quantity|disp(?:ense)?|#)\s*[:.]?\s*#?\s*"
+    r"(?P<amount>\d+)(?:\s+(?!(?:refills?|rf)\b)(?P<unit>[a-z]+))?",
+    re.IGNORECASE,
+)
+
+REFILLS_RE = re.compile(
+    r"(?:refills?|rf)\s*[:.]?\s*(?P<refills>\d+|none|no|zero)",
+    re.IGNORECASE,
+)
+
+# Lines that hint at medication content; a preamble containing any of these
+# cannot be silently dropped.
+DOSE_HINT_RE = re.compile(
+    r"\d\s*" + STRENGTH_UNITS + r"\b|\b(?:take|tablet|capsule|by mouth|"
+    r"daily|every\s+\d+\s+hours?|sig)\b",
+    re.IGNORECASE,
+)
+
+
+def _format_count(count):
+    value = NUMBER_WORDS.get(count.lower())
+    if value is None:
+        value = float(count)
+    return f"{value:g}"
+
+
+def parse_sig(line):
+    """Parse a directions line into (sig_code, frequency, purpose) or None."""
+    match = SIG_RE.match(line.strip())
+    if match is None:
+        return None
+
+    parts = [_format_count(match["count"]), FORMS[match["form"].lower()]]
+    if match["route"]:
+        parts.append(ROUTES[match["route"].lower()])
+
+    if match["hours"]:
+        parts.append(f"Q{int(match['hours'])}H")
+    elif match["times"]:
+        parts.append(TIMES_PER_DAY[match["times"].lower()])
+    else:
+        parts.append(FIXED_FREQUENCIES[
+            " ".join(match["frequency"].lower().split())])
+
+    if match["prn"]:
+        parts.append("PRN")
+    if match["with_food"]:
+        parts.append("WITH FOOD")
+    if match["days"]:
+        parts.append(f"X {int(match['days'])} DAYS")
+
+    frequency = " ".join(match["frequency"].split())
+    if match["prn"]:
+        frequency += " as needed"
+    purpose = match["purpose"] or match["prn_for"]
+    return " ".join(parts), frequency, purpose.strip() if purpose else None
+
+
+def _parse_supply(line):
+    """Parse quantity/refills from a line, or None if it has anything else."""
+    quantity = QUANTITY_RE.search(line)
+    refills = REFILLS_RE.search(line)
+    if quantity is None and refills is None:
+        return None
+
+    leftover = line
+    for match in (quantity, refills):
+        if match is not None:
+            leftover = leftover.replace(match.group(0), " ")
+    if leftover.strip(" \t,;:.-|"):
+        return None
+
+    result = {}
+    if quantity is not None:
+        amount = quantity["amount"]
+        result["quantity"] = (
+            f"{amount} {quantity['unit']}" if quantity["unit"] else amount)
+    if refills is not None:
+        value = refills["refills"].lower()
+        result["refills"] = "None" if value in (
+            "0", "none", "no", "zero") else value
+    return result
+
+
+def _is_supply_line(line):
+    """Quantity and refill lines, which can look like "name strength"."""
+    return _parse_supply(line) is not None or \
+        QUANTITY_RE.match(line) is not None or \
+        REFILLS_RE.match(line) is not None
+
+
+def split_blocks(text):
+    """Split OCR text into medication blocks, each starting at a drug line.
+
+    Lines before the first drug line (prescriber, patient, headers) form a
+    leading block of their own.
+    """
+    blocks = [[]]
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if blocks[-1] and not _is_supply_line(line) and \
+                MEDICATION_RE.match(line):
+            blocks.append([])
+        blocks[-1].append(line)
+    return ["\n".join(lines) for lines in blocks if lines]
+
+
+def parse_block(block):
+    """Parse one medication block, or return None unless fully understood."""
+    lines = block.splitlines()
+    header = MEDICATION_RE.match(lines[0])
+    if header is None:
+        return None
+
+    medication = {
+        "medication": " ".join(header["name"].split()),
+        "sig_code": None,
+        "dosage": " ".join(header["strength"].split()),
+        "frequency": None,
+        "quantity": None,
+        "refills": "None",
+        "purpose": None,
+    }
+
+    remaining = lines[1:]
+    if header["rest"]:
+        remaining.insert(0, header["rest"].lstrip(",:;-– "))
+
+    for line in remaining:
+        sig = parse_sig(line)
+        if sig is not None and medication["sig_code"] is None:
+            sig_code, frequency, purpose = sig
+            medication["sig_code"] = sig_code
+            medication["frequency"] = frequency
+            medication["purpose"] = purpose
+            continue
+        supply = _parse_supply(line)
+        if supply is not None:
+            medication.update(supply)
+            continue
+        return None
+
+    if medication["sig_code"] is None:
+        return None
+    return medication
+
+
+def fast_path(text):
+    """Parse what the rules can handle confidently.
+
+    Returns a list of (block_text, medication_or_None) in source order;
+    blocks mapped to None still need the LLM. A leading block with no
+    medication hints at all (prescriber or patient details) is dropped when
+    drug blocks follow it.
+    """
+    blocks = split_blocks(text)
+    segments = []
+    for index, block in enumerate(blocks):
+        medication = parse_block(block)
+        if medication is None and index == 0 and len(blocks) > 1 and \
+                not DOSE_HINT_RE.search(block):
+            continue
+        segments.append((block, medication))
+    return segments
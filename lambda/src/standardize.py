@@ -1,56 +1,186 @@
+import asyncio
 import json
 import logging
 import os
+import sqlite3
+import threading
+import time
+import weakref
 
-import openai
-from openai import OpenAI
+import cache
+import compact_format
+import drug_lexicon
+import json_stream
+import prefilter
+import sig_rules
+import timing
+import upstream
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# HTTP settings for the OpenAI client. The client (and its connection pool)
+# lives for the whole container, so warm invocations reuse open TLS
+# connections to the API instead of handshaking on every request.
+OPENAI_CONNECT_TIMEOUT = float(os.environ.get("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_READ_TIMEOUT = float(os.environ.get("OPENAI_READ_TIMEOUT", "50"))
+OPENAI_MAX_CONNECTIONS = int(os.environ.get("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_KEEPALIVE_EXPIRY = float(
+    os.environ.get("OPENAI_KEEPALIVE_EXPIRY", "300"))
+OPENAI_MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", "2"))
 
-def is_empty_medication(med):
-    """Check if a medication object contains only null values."""
-    return all(value is None for value in med.values())
+# Medication blocks standardized concurrently per request.
+STANDARDIZE_CONCURRENCY = int(os.environ.get("STANDARDIZE_CONCURRENCY", "4"))
 
+# Seconds of the Lambda's remaining time kept back for building the
+# response; OpenAI calls must finish before the rest runs out.
+OPENAI_DEADLINE_MARGIN = float(os.environ.get("OPENAI_DEADLINE_MARGIN", "2"))
 
-def lambda_handler(event, context):
-    try:
-        # Log the incoming event
-        logger.info(f"Received event: {json.dumps(event)}")
+# A call still running at this percentile of recent latencies gets a second,
+# hedged request and the first answer wins. 0 disables hedging; no hedge is
+# sent until HEDGE_MIN_SAMPLES latencies have been seen.
+HEDGE_PERCENTILE = float(os.environ.get("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES = int(os.environ.get("HEDGE_MIN_SAMPLES", "20"))
+# Fraction of recent calls that may be hedged, capping the extra spend.
+HEDGE_MAX_RATE = float(os.environ.get("HEDGE_MAX_RATE", "0.1"))
 
-        # Log all environment variables (excluding sensitive values)
-        logger.info("Environment variables present:")
-        for key in os.environ:
-            logger.info(
-                f"- {key}: {'[MASKED]' if 'KEY' in key.upper() else os.environ[key]}"
-            )
+# Consecutive upstream failures that open the circuit, and how long it stays
+# open before a trial request is let through. 0 failures disables it.
+BREAKER_FAILURES = int(os.environ.get("BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.environ.get("BREAKER_RESET_SECONDS", "30"))
 
-        # Parse the request body
-        body = json.loads(event["body"])
-        text = body["text"]
+_latency = upstream.LatencyTracker(min_samples=HEDGE_MIN_SAMPLES)
+_hedge_budget = upstream.HedgeBudget(HEDGE_MAX_RATE)
+_breaker = upstream.CircuitBreaker(BREAKER_FAILURES, BREAKER_RESET_SECONDS)
 
-        # Log OpenAI API key presence (not the key itself)
-        api_key = os.environ.get("OPENAI_API_KEY")
-        logger.info(f"OpenAI API key present: {api_key is not None}")
-        logger.info(f"OpenAI API key length: {len(api_key) if api_key else 0}")
+_client = None
+_client_api_key = None
+# (api_key, AsyncOpenAI) per event loop; entries go with their loop.
+_async_clients = weakref.WeakKeyDictionary()
+_async_clients_lock = threading.Lock()
+# Close tasks of replaced clients, referenced until they finish.
+_closing = set()
 
-        if not api_key:
-            raise ValueError(
-                "OpenAI API key not found in environment variables")
 
-        # Initialize OpenAI client
-        client = OpenAI(api_key=api_key)
+def _openai():
+    """The openai package, imported on first use.
 
-        # Call OpenAI API
-        logger.info("Making request to OpenAI API")
-        response = client.chat.completions.create(
-            model="chatgpt-4o-latest",
-            messages=[
-                {
-                    "role": "system",
-                    "content": """You are a medical assistant tasked with extracting structured medication information and generating SIG codes.
+    Importing the SDK (and its pydantic models for every API resource) is
+    most of this function's cold start, and requests answered by the cache,
+    the prefilter or the rules never need it.
+    """
+    import openai
+
+    return openai
+
+
+def get_client(api_key):
+    """Return the container-wide OpenAI client, rebuilding it on key change."""
+    global _client, _client_api_key
+    if _client is not None and _client_api_key == api_key:
+        return _client
+
+    if _client is not None:
+        logger.info("OpenAI API key changed; rebuilding the client")
+        _client.close()
+
+    import httpx
+
+    _client = _openai().OpenAI(
+        api_key=api_key,
+        max_retries=OPENAI_MAX_RETRIES,
+        timeout=httpx.Timeout(
+            OPENAI_READ_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+        http_client=httpx.Client(
+            limits=_limits(),
+            timeout=httpx.Timeout(
+                OPENAI_READ_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+        ),
+    )
+    _client_api_key = api_key
+    return _client
+
+
+def _limits():
+    import httpx
+
+    return httpx.Limits(
+        max_connections=OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+        keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+    )
+
+
+def get_async_client(api_key):
+    """Return the AsyncOpenAI client for the running event loop.
+
+    httpx async connections belong to the loop that opened them, so each
+    loop (the server's, and every worker thread's) keeps its own client,
+    which is rebuilt only when the key changes.
+    """
+    loop = asyncio.get_running_loop()
+    with _async_clients_lock:
+        entry = _async_clients.get(loop)
+    if entry is not None and entry[0] == api_key:
+        return entry[1]
+
+    if entry is not None:
+        logger.info("OpenAI API key changed; rebuilding the async client")
+        closing = loop.create_task(entry[1].close())
+        _closing.add(closing)
+        closing.add_done_callback(_closing.discard)
+
+    import httpx
+
+    client = _openai().AsyncOpenAI(
+        api_key=api_key,
+        max_retries=OPENAI_MAX_RETRIES,
+        timeout=httpx.Timeout(
+            OPENAI_READ_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+        http_client=httpx.AsyncClient(
+            limits=_limits(),
+            timeout=httpx.Timeout(
+                OPENAI_READ_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+        ),
+    )
+    with _async_clients_lock:
+        _async_clients[loop] = (api_key, client)
+    return client
+
+
+# One persistent loop per thread: a loop cannot run twice at once, and the
+# server's job worker threads all call run().
+_local = threading.local()
+
+
+def run(coro):
+    """Run a coroutine on this thread's persistent event loop.
+
+    Keeping the loop alive lets the async client's keep-alive connections
+    survive between warm invocations.
+    """
+    loop = getattr(_local, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = _local.loop = asyncio.new_event_loop()
+    return loop.run_until_complete(coro)
+
+
+def close_loop():
+    """Close this thread's loop; call it before a thread that used run()
+    exits."""
+    loop = getattr(_local, "loop", None)
+    if loop is None or loop.is_closed():
+        return
+    with _async_clients_lock:
+        entry = _async_clients.pop(loop, None)
+    if entry is not None:
+        loop.run_until_complete(entry[1].close())
+    loop.run_until_complete(loop.shutdown_asyncgens())
+    loop.close()
+
+
+SYSTEM_PROMPT = """You are a medical assistant tasked with extracting structured medication information and generating SIG codes.
                         For each medication, provide a **strictly valid JSON** array of objects. Do not include any additional text, explanations, or comments.
                         The output must start with '[' and end with ']', containing only the JSON array.
 
@@ -75,106 +205,680 @@ def lambda_handler(event, context):
                                 "purpose": null
                             }
                         ]
-                        """,
+                        """
+
+# "compact" has the model write one '|'-delimited line per medication, which
+# is expanded locally into the JSON objects; "json" uses SYSTEM_PROMPT;
+# "json_schema" has the API constrain the output to MEDICATIONS_SCHEMA.
+OUTPUT_FORMAT = os.environ.get("OUTPUT_FORMAT", "compact").lower()
+
+# Structured outputs need a model snapshot that supports json_schema.
+MODEL = os.environ.get(
+    "OPENAI_MODEL",
+    "gpt-4o-2024-08-06" if OUTPUT_FORMAT == "json_schema"
+    else "chatgpt-4o-latest")
+
+# Completions that cannot be parsed are requested again this many times
+# before the request fails.
+PARSE_RETRIES = int(os.environ.get("PARSE_RETRIES", "1"))
+
+STRUCTURED_SYSTEM_PROMPT = """You are a medical assistant tasked with extracting structured medication information and generating SIG codes.
+Return every medication in the text in the medications array, with:
+- medication: The name of the medication
+- sig_code: The standardized SIG code
+- dosage: The medication dosage
+- frequency: How often to take the medication
+- quantity: The total amount prescribed
+- refills: Number of refills or None
+- purpose: The purpose of the medication if specified
+Use null for any field that is not provided. If there are no medications, return an empty array."""
+
+MEDICATIONS_SCHEMA = {
+    "name": "medications",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "medications": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        field: {"type": ["string", "null"]}
+                        for field in compact_format.FIELDS
+                    },
+                    "required": list(compact_format.FIELDS),
+                    "additionalProperties": False,
                 },
-                {"role": "user", "content": text}
-            ]
-        )
+            },
+        },
+        "required": ["medications"],
+        "additionalProperties": False,
+    },
+}
+
+# Bump whenever the prompt or the model changes so cached results from the
+# old prompt are not served.
+PROMPT_VERSION = "1"
 
-        # Process the response
+# Standardized results keyed by normalized OCR text. STANDARDIZE_CACHE picks
+# the backend: "memory" (per-container LRU), "sqlite" (local file) or "off".
+STANDARDIZE_CACHE = os.environ.get("STANDARDIZE_CACHE", "memory").lower()
+STANDARDIZE_CACHE_TTL = float(
+    os.environ.get("STANDARDIZE_CACHE_TTL", str(24 * 60 * 60)))
+STANDARDIZE_CACHE_ENTRIES = int(
+    os.environ.get("STANDARDIZE_CACHE_ENTRIES", "1024"))
+STANDARDIZE_CACHE_PATH = os.environ.get(
+    "STANDARDIZE_CACHE_PATH", "/tmp/standardize-cache.sqlite3")
+
+
+# Parse routine directions locally and send only the rest to the model.
+SIG_FAST_PATH = os.environ.get("SIG_FAST_PATH", "1").lower() in (
+    "1", "true", "yes")
+
+
+# Fix OCR misreads of drug names ("Lisinopri1") before anything else runs.
+OCR_CORRECTION = os.environ.get("OCR_CORRECTION", "1").lower() in (
+    "1", "true", "yes")
+
+# Answer texts with no drug-like content locally instead of calling the model.
+PREFILTER = os.environ.get("PREFILTER", "1").lower() in ("1", "true", "yes")
+
+
+def _build_cache():
+    if STANDARDIZE_CACHE == "sqlite":
         try:
-            response_text = response.choices[0].message.content.strip()
-            medications_array = json.loads(response_text)
-
-            # Check if all medications are empty/null
-            if all(is_empty_medication(med) for med in medications_array):
-                logger.info("All medications contain null values")
-                return {
-                    "statusCode": 200,
-                    "headers": {
-                        "Content-Type": "application/json",
-                        "Access-Control-Allow-Origin": "*",
-                    },
-                    "body": json.dumps({
-                        "success": False,
-                        "noMedications": True,
-                        "error": "No medications or SIG codes could be identified in the text"
-                    }),
-                }
-
-            # Filter out any completely null medications
-            valid_medications = [
-                med for med in medications_array if not is_empty_medication(med)]
-
-            if not valid_medications:
-                logger.info("No valid medications found after filtering")
-                return {
-                    "statusCode": 200,
-                    "headers": {
-                        "Content-Type": "application/json",
-                        "Access-Control-Allow-Origin": "*",
-                    },
-                    "body": json.dumps({
-                        "success": False,
-                        "noMedications": True,
-                        "error": "No medications or SIG codes could be identified in the text"
-                    }),
-                }
-
-            standardized_text = {"medications": valid_medications}
-            logger.info(
-                "Successfully received and parsed response from OpenAI")
+            return cache.SQLiteCache(
+                STANDARDIZE_CACHE_PATH, STANDARDIZE_CACHE_TTL,
+                STANDARDIZE_CACHE_ENTRIES)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"SQLite cache unavailable, using memory: {e}")
+    elif STANDARDIZE_CACHE in ("off", "none", ""):
+        return None
+    return cache.LRUCache(STANDARDIZE_CACHE_ENTRIES, STANDARDIZE_CACHE_TTL)
+
+
+RESULT_CACHE = _build_cache()
+
+
+def normalize_text(text):
+    """Collapse whitespace and case so trivially different OCR text matches."""
+    return " ".join(text.split()).lower()
+
+
+def cache_key(text):
+    return cache.content_key(
+        normalize_text(text).encode("utf-8"), PROMPT_VERSION, OUTPUT_FORMAT,
+        MODEL,
+        sig_rules.RULES_VERSION if SIG_FAST_PATH else None)
+
+
+def is_empty_medication(med):
+    """Check if a medication object contains only null values."""
+    return all(value is None for value in med.values())
+
+
+def _response(status_code, body):
+    return {
+        "statusCode": status_code,
+        "headers": {
+            "Content-Type": "application/json",
+            "Access-Control-Allow-Origin": "*",
+        },
+        "body": json.dumps(body),
+    }
 
-            return {
-                "statusCode": 200,
-                "headers": {
-                    "Content-Type": "application/json",
-                    "Access-Control-Allow-Origin": "*",
-                },
-                "body": json.dumps({
-                    "success": True,
-                    "text": standardized_text
-                }),
-            }
 
-        except json.JSONDecodeError as e:
+def _no_medications_response(**extra):
+    return _response(200, {
+        "success": False,
+        "noMedications": True,
+        "error": "No medications or SIG codes could be identified in the text",
+        **extra,
+    })
+
+
+def _messages(text):
+    if OUTPUT_FORMAT == "compact":
+        system_prompt = compact_format.SYSTEM_PROMPT
+    elif OUTPUT_FORMAT == "json_schema":
+        system_prompt = STRUCTURED_SYSTEM_PROMPT
+    else:
+        system_prompt = SYSTEM_PROMPT
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": text}
+    ]
+
+
+def _completion_args(text):
+    """Keyword arguments for chat.completions.create() for this format."""
+    args = {"model": MODEL, "messages": _messages(text)}
+    if OUTPUT_FORMAT == "json_schema":
+        args["response_format"] = {
+            "type": "json_schema", "json_schema": MEDICATIONS_SCHEMA}
+    return args
+
+
+def _parse_completion(response_text):
+    """Decode the model's output and drop all-null medications."""
+    if OUTPUT_FORMAT == "compact":
+        try:
+            medications_array = compact_format.validate(
+                compact_format.decode(response_text))
+        except ValueError as e:
+            logger.error(f"Failed to decode compact OpenAI response: {e}")
+            raise ValueError("Invalid compact response from OpenAI") from e
+    else:
+        # Recovers the array from code fences or surrounding prose too.
+        try:
+            medications_array = json_stream.extract_array(
+                response_text or "")
+        except ValueError as e:
             logger.error(f"Failed to parse OpenAI response as JSON: {e}")
             raise ValueError("Invalid JSON response from OpenAI") from e
 
-    except openai.APIError as e:
-        logger.error(f"OpenAI API Error: {e}")
-        return {
-            "statusCode": 500,
-            "headers": {
-                "Content-Type": "application/json",
-                "Access-Control-Allow-Origin": "*",
-            },
-            "body": json.dumps(
-                {"error": f"OpenAI API Error: {str(e)}", "status": "error"}
-            ),
-        }
+    # Filter out any completely null medications
+    valid_medications = [
+        med for med in medications_array if not is_empty_medication(med)]
+    if not valid_medications:
+        logger.info("All medications contain null values")
+    return valid_medications
+
+
+def new_stats():
+    """Per-request counters reported in the metrics log line."""
+    return {"llm_calls": 0, "parse_retries": 0, "hedged_requests": 0}
+
+
+def request_deadline(context):
+    """time.monotonic() by which OpenAI calls must be done, or None."""
+    get_remaining = getattr(context, "get_remaining_time_in_millis", None)
+    if get_remaining is None:
+        return None
+    return time.monotonic() + get_remaining() / 1000 - OPENAI_DEADLINE_MARGIN
+
+
+def _attempt_timeout(deadline):
+    """Per-attempt HTTP timeout, shortened to fit the deadline."""
+    timeout = upstream.remaining(deadline)
+    if timeout is None:
+        return None
+    if timeout <= 0:
+        raise upstream.DeadlineExceeded("No time left to call OpenAI")
+    import httpx
+
+    return httpx.Timeout(
+        min(OPENAI_READ_TIMEOUT, timeout),
+        connect=min(OPENAI_CONNECT_TIMEOUT, timeout))
+
+
+def _is_upstream_failure(error):
+    """Errors that say the API is degraded, as opposed to a bad request."""
+    openai = _openai()
+    return isinstance(error, (
+        openai.APIConnectionError,
+        openai.InternalServerError,
+        openai.RateLimitError,
+    ))
+
+
+async def _complete(client, text, stats, deadline):
+    """One completion, hedged, bounded by the deadline and the breaker."""
+    timeout = _attempt_timeout(deadline)
+    _breaker.before()
+    hedge_after = None
+    if HEDGE_PERCENTILE > 0:
+        hedge_after = _latency.percentile(HEDGE_PERCENTILE)
+
+    async def attempt():
+        stats["llm_calls"] += 1
+        started = time.monotonic()
+        args = _completion_args(text)
+        if timeout is not None:
+            args["timeout"] = timeout
+        try:
+            response = await client.chat.completions.create(**args)
+        except asyncio.CancelledError:
+            # A slow attempt that lost the race (or ran out of deadline)
+            # took at least this long; leaving it out would pull the
+            # percentile down until ever more calls were hedged.
+            _latency.record(time.monotonic() - started)
+            raise
+        _latency.record(time.monotonic() - started)
+        return response
+
+    def on_hedge():
+        stats["hedged_requests"] += 1
+        logger.info(f"Hedging OpenAI request after {hedge_after:.2f}s")
+
+    _hedge_budget.record_call()
+    try:
+        call = upstream.hedged(
+            attempt, hedge_after, on_hedge, _hedge_budget.try_hedge)
+        if timeout is None:
+            response = await call
+        else:
+            # The client retries internally; this bounds all of its attempts.
+            response = await asyncio.wait_for(
+                call, upstream.remaining(deadline))
+    except asyncio.TimeoutError as e:
+        # The request's own deadline ran out, which in the pipeline is mostly
+        # spent on OCR; it says nothing about OpenAI. HTTP timeouts of the
+        # attempts themselves surface as APITimeoutError below.
+        _breaker.release()
+        raise upstream.DeadlineExceeded(
+            "OpenAI did not respond before the deadline") from e
+    except Exception as e:
+        if _is_upstream_failure(e):
+            _breaker.record_failure()
+        else:
+            _breaker.release()
+        raise
+    except BaseException:
+        _breaker.release()
+        raise
+    _breaker.record_success()
+    return response
+
+
+async def standardize_text_async(text, api_key, stats=None, deadline=None):
+    """Standardize OCR text into a list of non-empty medication objects.
+
+    An unparseable completion is requested again up to PARSE_RETRIES times;
+    calls and retries are counted in stats. Every attempt must finish before
+    deadline (a time.monotonic() value) when one is given.
+    """
+    stats = stats if stats is not None else new_stats()
+    client = get_async_client(api_key)
+
+    for attempt in range(PARSE_RETRIES + 1):
+        # Call OpenAI API
+        logger.info("Making request to OpenAI API")
+        response = await _complete(client, text, stats, deadline)
+        try:
+            return _parse_completion(response.choices[0].message.content)
+        except ValueError:
+            if attempt == PARSE_RETRIES:
+                raise
+            stats["parse_retries"] += 1
+            logger.info("Retrying OpenAI request after a parse failure")
+
+
+def standardize_text(text, api_key, stats=None, deadline=None):
+    """Synchronous wrapper around standardize_text_async()."""
+    return run(standardize_text_async(text, api_key, stats, deadline))
+
+
+async def standardize_blocks_async(blocks, api_key, stats=None,
+                                   deadline=None):
+    """Standardize blocks concurrently, returning one list per block in order.
+
+    At most STANDARDIZE_CONCURRENCY requests are in flight, so wall time
+    tracks the slowest block rather than the sum of all of them. If any
+    block fails the others are cancelled before the error propagates, so
+    they cannot finish later on the persistent loop during another request.
+    """
+    semaphore = asyncio.Semaphore(max(1, STANDARDIZE_CONCURRENCY))
+
+    async def standardize_block(block):
+        async with semaphore:
+            return await standardize_text_async(
+                block, api_key, stats, deadline)
+
+    tasks = [asyncio.ensure_future(standardize_block(b)) for b in blocks]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def standardize_with_rules_async(text, api_key, stats=None,
+                                       deadline=None, timer=timing.NULL_TIMER):
+    """Standardize text block by block, using the rules where confident.
+
+    Blocks the rules cannot parse (all blocks when SIG_FAST_PATH is off) are
+    sent to the model concurrently, one request per block, and the results
+    are merged back in source order.
+    """
+    with timer.span("rules"):
+        if SIG_FAST_PATH:
+            segments = sig_rules.fast_path(text)
+        else:
+            segments = [
+                (block, None) for block in sig_rules.split_blocks(text)]
+
+    unparsed = [block for block, med in segments if med is None]
+    logger.info(
+        f"SIG fast path parsed {len(segments) - len(unparsed)} of "
+        f"{len(segments)} blocks")
+
+    with timer.span("llm"):
+        results = iter(await standardize_blocks_async(
+            unparsed, api_key, stats, deadline))
+    medications = []
+    for _, med in segments:
+        if med is not None:
+            medications.append(med)
+        else:
+            medications.extend(next(results))
+    return medications
+
+
+def standardize_with_rules(text, api_key, stats=None, deadline=None):
+    """Synchronous wrapper around standardize_with_rules_async()."""
+    return run(standardize_with_rules_async(text, api_key, stats, deadline))
+
+
+def stream_text(text, api_key, deadline=None):
+    """Stream a completion and yield each non-empty medication as it closes."""
+    client = get_client(api_key)
+
+    args = _completion_args(text)
+    timeout = _attempt_timeout(deadline)
+    if timeout is not None:
+        args["timeout"] = timeout
+    _breaker.before()
+
+    logger.info("Making streaming request to OpenAI API")
+    try:
+        stream = client.chat.completions.create(**args, stream=True)
+    except Exception as e:
+        if _is_upstream_failure(e):
+            _breaker.record_failure()
+        else:
+            _breaker.release()
+        raise
+    _breaker.record_success()
+
+    if OUTPUT_FORMAT == "compact":
+        decoder = compact_format.StreamDecoder()
+        feed, finish = decoder.feed, decoder.close
+    else:
+        parser = json_stream.ArrayParser()
+        feed = parser.feed
+
+        def finish():
+            if not parser.started:
+                raise ValueError("No JSON array in the response")
+            return []
+
+    def valid(meds):
+        return [
+            med for med in meds
+            if isinstance(med, dict) and not is_empty_medication(med)
+        ]
+
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            yield from valid(feed(delta))
+        yield from valid(finish())
     except ValueError as e:
-        logger.error(f"Value error: {e}")
-        return {
-            "statusCode": 400,
-            "headers": {
-                "Content-Type": "application/json",
-                "Access-Control-Allow-Origin": "*",
-            },
-            "body": json.dumps({"error": str(e), "status": "error"}),
-        }
+        logger.error(f"Failed to parse streamed OpenAI response: {e}")
+        raise ValueError("Invalid response from OpenAI") from e
+    finally:
+        stream.close()
+
+
+def stream_medications(text, api_key, deadline=None):
+    """Yield medications in source order as soon as each one is complete.
+
+    Rule-parsed blocks are yielded immediately; the remaining blocks are
+    streamed from the model in a single request at the position of the first
+    of them, as in standardize_with_rules().
+    """
+    if not SIG_FAST_PATH:
+        yield from stream_text(text, api_key, deadline)
+        return
+
+    segments = sig_rules.fast_path(text)
+    unparsed = [block for block, med in segments if med is None]
+    streamed = False
+    for _, med in segments:
+        if med is not None:
+            yield med
+        elif not streamed:
+            streamed = True
+            yield from stream_text(
+                "\n\n".join(unparsed), api_key, deadline)
+
+
+def ndjson_lines(text, api_key, key, deadline=None):
+    """Yield NDJSON lines: one medication per line, then a summary line.
+
+    Blocks on the synchronous streaming client, so run it off the event
+    loop. A failure mid-stream becomes a final error line.
+    """
+    cached = RESULT_CACHE.get(key) if RESULT_CACHE is not None else None
+    if cached is not None:
+        medications = iter(cached["medications"])
+    else:
+        medications = stream_medications(text, api_key, deadline)
+
+    collected = []
+    try:
+        for med in medications:
+            collected.append(med)
+            yield json.dumps(med)
+    except (ValueError, _openai().APIError, upstream.CircuitOpenError,
+            upstream.DeadlineExceeded) as e:
+        logger.error(f"Streaming standardization failed: {e}")
+        yield json.dumps({"error": str(e), "status": "error"})
+        return
+
+    if cached is None and RESULT_CACHE is not None:
+        RESULT_CACHE.set(key, {"medications": collected})
+    summary = {"done": True, "count": len(collected)}
+    if not collected:
+        summary["noMedications"] = True
+    yield json.dumps(summary)
+
+
+def _ndjson_response(text, api_key, key, deadline=None):
+    """Build a buffered NDJSON response from ndjson_lines().
+
+    Python Lambda runtimes cannot use response streaming; server.py sends
+    the lines as they are produced instead (see handle_request_async).
+    """
+    return _ndjson_lines(list(ndjson_lines(text, api_key, key, deadline)))
+
+
+def _ndjson_lines(lines):
+    """An NDJSON response; a list of lines is joined into the body, while
+    an iterator is left for a streaming server to send line by line."""
+    if isinstance(lines, list):
+        body = "\n".join(lines) + "\n"
+    else:
+        body = (line + "\n" for line in lines)
+    return {
+        "statusCode": 200,
+        "headers": {
+            "Content-Type": "application/x-ndjson",
+            "Access-Control-Allow-Origin": "*",
+        },
+        "body": body,
+    }
+
+
+def wants_stream(event, body):
+    """Whether the client asked for NDJSON via the body or Accept header."""
+    headers = {
+        k.lower(): v for k, v in (event.get("headers") or {}).items()}
+    return bool(body.get("stream")) or \
+        "application/x-ndjson" in headers.get("accept", "")
+
+
+def error_response(error):
+    """Map an exception raised while standardizing to an HTTP response."""
+    if isinstance(error, upstream.CircuitOpenError):
+        logger.error(f"OpenAI circuit open: {error}")
+        return _response(503, {"error": str(error), "status": "error"})
+    if isinstance(error, upstream.DeadlineExceeded):
+        logger.error(f"OpenAI deadline exceeded: {error}")
+        return _response(504, {"error": str(error), "status": "error"})
+    if isinstance(error, ValueError):
+        logger.error(f"Value error: {error}")
+        return _response(400, {"error": str(error), "status": "error"})
+    if isinstance(error, _openai().APIError):
+        logger.error(f"OpenAI API Error: {error}")
+        return _response(500, {
+            "error": f"OpenAI API Error: {str(error)}", "status": "error"})
+    logger.error("Unexpected error occurred", exc_info=error)
+    return _response(500, {
+        "error": "An unexpected error occurred. Please check the logs.",
+        "status": "error",
+    })
+
+
+def prepare_text(text, timer=timing.NULL_TIMER):
+    """Correct drug names and run the prefilter.
+
+    Returns (text, corrections, classification); classification is None
+    when PREFILTER is off.
+    """
+    corrections = []
+    if OCR_CORRECTION:
+        with timer.span("correct"):
+            text, corrections = drug_lexicon.correct_text(text)
+        if corrections:
+            logger.info(f"Corrected drug names: {corrections}")
+
+    classification = None
+    if PREFILTER:
+        with timer.span("prefilter"):
+            classification = prefilter.classify(text)
+        logger.info(f"Prefilter: {json.dumps(classification)}")
+    return text, corrections, classification
+
+
+async def standardize_cached_async(text, api_key, deadline=None,
+                                   timer=timing.NULL_TIMER):
+    """Standardize prepared text through RESULT_CACHE.
+
+    Returns ({"medications": [...]}, cached).
+    """
+    with timer.span("cache"):
+        key = cache_key(text)
+        cached = RESULT_CACHE.get(key) if RESULT_CACHE is not None else None
+    if cached is not None:
+        logger.info("Standardization cache hit")
+        return cached, True
+
+    stats = new_stats()
+    try:
+        standardized_text = {
+            "medications": await standardize_with_rules_async(
+                text, api_key, stats, deadline, timer)}
+    finally:
+        logger.info("Standardize metrics: " + json.dumps(
+            {"format": OUTPUT_FORMAT, "model": MODEL, **stats}))
+        for name, value in stats.items():
+            timer.count(name, value)
+    if RESULT_CACHE is not None:
+        RESULT_CACHE.set(key, standardized_text)
+    return standardized_text, False
+
+
+def standardize_cached(text, api_key, deadline=None, timer=timing.NULL_TIMER):
+    """Synchronous wrapper around standardize_cached_async()."""
+    return run(standardize_cached_async(text, api_key, deadline, timer))
+
+
+def corrections_body(corrections):
+    return [
+        {"from": original, "to": corrected}
+        for original, corrected in corrections
+    ]
+
+
+async def handle_request_async(event, deadline=None, timer=timing.NULL_TIMER,
+                               stream_body=False):
+    """Handle a standardize request event and return the response.
+
+    With stream_body, an NDJSON response's body is a blocking iterator of
+    lines for the caller to send as they arrive, rather than one string.
+    Exceptions propagate; callers map them with error_response().
+    """
+    # Parse the request body
+    with timer.span("parse"):
+        body = json.loads(event["body"])
+    text = body["text"]
+
+    # Log OpenAI API key presence (not the key itself)
+    api_key = os.environ.get("OPENAI_API_KEY")
+    logger.info(f"OpenAI API key present: {api_key is not None}")
+    logger.info(f"OpenAI API key length: {len(api_key) if api_key else 0}")
+
+    if not api_key:
+        raise ValueError(
+            "OpenAI API key not found in environment variables")
+
+    text, corrections, classification = prepare_text(text, timer)
+    if classification is not None and \
+            classification["decision"] == "no_medication":
+        if wants_stream(event, body):
+            return _ndjson_lines([json.dumps({
+                "done": True, "count": 0, "noMedications": True,
+                "prefilter": classification})])
+        return _no_medications_response(prefilter=classification)
+
+    if wants_stream(event, body):
+        if stream_body:
+            return _ndjson_lines(
+                ndjson_lines(text, api_key, cache_key(text), deadline))
+        # The streaming client is synchronous; keep it off the event loop.
+        return await asyncio.get_running_loop().run_in_executor(
+            None, _ndjson_response, text, api_key, cache_key(text), deadline)
+
+    standardized_text, cached = await standardize_cached_async(
+        text, api_key, deadline, timer)
+
+    if not standardized_text["medications"]:
+        return _no_medications_response(prefilter=classification)
+
+    logger.info("Successfully received and parsed response from OpenAI")
+    return _response(200, {
+        "success": True,
+        "text": standardized_text,
+        "cached": cached,
+        "prefilter": classification,
+        "corrections": corrections_body(corrections),
+    })
+
+
+def finish_response(response, timer):
+    """Add the Server-Timing header and print the request's EMF line."""
+    response.setdefault("headers", {})["Server-Timing"] = \
+        timer.server_timing()
+    print(json.dumps(timer.emf(
+        "standardize", status=response["statusCode"], format=OUTPUT_FORMAT,
+        model=MODEL)))
+    return response
+
+
+def lambda_handler(event, context):
+    timer = timing.Timer()
+    try:
+        # Log the incoming event
+        logger.info(f"Received event: {json.dumps(event)}")
+
+        # Log all environment variables (excluding sensitive values)
+        logger.info("Environment variables present:")
+        for key in os.environ:
+            logger.info(
+                f"- {key}: {'[MASKED]' if 'KEY' in key.upper() else os.environ[key]}"
+            )
+
+        response = run(handle_request_async(
+            event, request_deadline(context), timer))
     except Exception as e:
-        logger.error("Unexpected error occurred", exc_info=True)
-        return {
-            "statusCode": 500,
-            "headers": {
-                "Content-Type": "application/json",
-                "Access-Control-Allow-Origin": "*",
-            },
-            "body": json.dumps(
-                {
-                    "error": "An unexpected error occurred. Please check the logs.",
-                    "status": "error",
-                }
-            ),
-        }
+        response = error_response(e)
+    return finish_response(response, timer)
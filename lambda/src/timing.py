@@ -0,0 +1,122 @@
+"""Per-request stage timers for the Server-Timing header and EMF logs.
+
+A Timer collects named durations. Spans are plain objects with __enter__
+and __exit__ around two perf_counter() calls, so timing a stage costs about
+a microsecond; stages that run on several threads (pages of one image)
+accumulate into one total.
+
+    timer = timing.Timer()
+    with timer.span("decode"):
+        ...
+    headers["Server-Timing"] = timer.server_timing()
+    print(json.dumps(timer.emf("extract", images=1)))
+"""
+import os
+import threading
+import time
+
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "SigStandardizer")
+
+
+class _Span:
+    __slots__ = ("_timer", "_name", "_started")
+
+    def __init__(self, timer, name):
+        self._timer = timer
+        self._name = name
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._timer.add(self._name, time.perf_counter() - self._started)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class Timer:
+    """Named stage durations for one request, in milliseconds."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = {}
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def span(self, name):
+        return _Span(self, name)
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.durations[name] = \
+                self.durations.get(name, 0.0) + seconds * 1000
+
+    def count(self, name, value=1):
+        """Record a count metric (retries, cache hits) alongside timings."""
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self):
+        """The Server-Timing header value, ending with the total."""
+        entries = [
+            f"{name};dur={ms:.2f}" for name, ms in self.durations.items()]
+        entries.append(f"total;dur={self.total_ms():.2f}")
+        return ", ".join(entries)
+
+    def emf(self, service, **properties):
+        """A CloudWatch Embedded Metric Format record for this request.
+
+        Print it as a single line (not through logging, whose prefix would
+        stop CloudWatch from extracting the metrics). properties are logged
+        alongside but not published as metrics.
+        """
+        durations = {
+            f"{name}_ms": round(ms, 3) for name, ms in self.durations.items()}
+        durations["total_ms"] = round(self.total_ms(), 3)
+        metrics = [
+            {"Name": name, "Unit": "Milliseconds"} for name in durations]
+        metrics += [{"Name": name, "Unit": "Count"} for name in self.counts]
+        return {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": METRICS_NAMESPACE,
+                    "Dimensions": [["Service"]],
+                    "Metrics": metrics,
+                }],
+            },
+            "Service": service,
+            **properties,
+            **durations,
+            **self.counts,
+        }
+
+
+class _NullTimer:
+    """Stands in when the caller does not time the request."""
+
+    def span(self, name):
+        return _NULL_SPAN
+
+    def add(self, name, seconds):
+        pass
+
+    def count(self, name, value=1):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+NULL_TIMER = _NullTimer()
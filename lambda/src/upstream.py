@@ -0,0 +1,177 @@
+"""Guards for calls to a slow or flaky upstream API.
+
+LatencyTracker keeps a window of recent call latencies so a hedge can fire
+once a call has run longer than, say, the 95th percentile. CircuitBreaker
+fails calls fast while the upstream keeps failing, instead of letting every
+request wait out its timeout. hedged() runs the call and, if it is still
+pending after the hedge delay, a second copy, returning whichever finishes
+first; HedgeBudget caps how many calls may be hedged.
+"""
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream the breaker considers down."""
+
+
+class DeadlineExceeded(Exception):
+    """Raised when no time is left in the request's deadline."""
+
+
+class LatencyTracker:
+    """Rolling window of call latencies in seconds."""
+
+    def __init__(self, window=200, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, percent):
+        """The given percentile, or None until min_samples are recorded."""
+        with self._lock:
+            if len(self._samples) < max(1, self.min_samples):
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1,
+                    max(0, math.ceil(percent / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+
+class HedgeBudget:
+    """Allows hedges for at most max_rate of the recent calls.
+
+    Without a cap, a latency percentile that drifts low would hedge more and
+    more calls, multiplying spend.
+    """
+
+    def __init__(self, max_rate=0.1, window=200):
+        self.max_rate = max_rate
+        # True for a hedge, False for a call.
+        self._events = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record_call(self):
+        with self._lock:
+            self._events.append(False)
+
+    def try_hedge(self):
+        """Count a hedge and return True if the budget has room for it."""
+        with self._lock:
+            hedges = sum(self._events)
+            calls = len(self._events) - hedges
+            if hedges + 1 > self.max_rate * calls:
+                return False
+            self._events.append(True)
+            return True
+
+
+class CircuitBreaker:
+    """Open after failure_threshold consecutive failures.
+
+    While open, before() raises CircuitOpenError. After reset_timeout
+    seconds one trial call is let through (half-open); its success closes
+    the circuit and its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._trial or \
+                    time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def before(self):
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            if self._opened_at is None:
+                return
+            elapsed = time.monotonic() - self._opened_at
+            if self._trial or elapsed < self.reset_timeout:
+                raise CircuitOpenError(
+                    "Upstream circuit is open after repeated failures")
+            self._trial = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.failure_threshold > 0:
+                self._opened_at = time.monotonic()
+                self._trial = False
+
+    def release(self):
+        """End a call that says nothing about upstream health (the caller
+        ran out of its own time, or sent a bad request), freeing the
+        half-open trial for the next call."""
+        with self._lock:
+            self._trial = False
+
+
+def remaining(deadline):
+    """Seconds left before a time.monotonic() deadline (None if unbounded)."""
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+async def hedged(call, hedge_after=None, on_hedge=None, allow_hedge=None):
+    """Await call(), starting a second call() after hedge_after seconds.
+
+    The first call to succeed wins and the other is cancelled. If one copy
+    fails while the other is still running, the other's result is used.
+    allow_hedge, if given, is asked before hedging; when it returns False
+    the first call is simply awaited.
+    """
+    first = asyncio.ensure_future(call())
+    pending = {first}
+    try:
+        if hedge_after is None:
+            return await first
+
+        done, _ = await asyncio.wait(pending, timeout=max(0, hedge_after))
+        if done:
+            return first.result()
+        if allow_hedge is not None and not allow_hedge():
+            return await first
+
+        if on_hedge is not None:
+            on_hedge()
+        pending.add(asyncio.ensure_future(call()))
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            if not task.done():
+                task.cancel()
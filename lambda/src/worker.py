@@ -0,0 +1,194 @@
+"""Drain the job queue through the extract and standardize logic.
+
+Run one or more of these next to the job API:
+
+    python worker.py [--poll-interval 0.5] [--once]
+
+Jobs that fail on bad input, including images that cannot be decoded or
+OCRed, are marked failed straight away; upstream errors (OpenAI outages,
+timeouts, an open circuit) are queued again, with an exponential delay,
+until the queue's attempt limit is reached.
+"""
+import argparse
+import binascii
+import json
+import logging
+import os
+import threading
+import time
+
+import pytesseract
+from PIL import Image
+
+import extract
+import job_queue
+import ocr
+import pipeline
+import standardize
+import upstream
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", "0.5"))
+
+# Delay before a failed job's first retry, doubling with each attempt. While
+# the OpenAI circuit is open a job waits at least until it may close.
+JOB_RETRY_DELAY = float(os.environ.get("JOB_RETRY_DELAY", "5"))
+
+# Errors that running the job again cannot fix: bad requests, and uploads
+# Pillow cannot decode (UnidentifiedImageError and truncated files are
+# OSErrors) or Tesseract rejects.
+PERMANENT_ERRORS = (
+    ValueError,
+    KeyError,
+    OSError,
+    SyntaxError,
+    Image.DecompressionBombError,
+    pytesseract.TesseractError,
+    ocr.TesseractEngineError,
+)
+
+
+def _images(payload):
+    return [binascii.a2b_base64(image) for image in payload["images"]]
+
+
+def _api_key():
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OpenAI API key not found in environment variables")
+    return api_key
+
+
+def _run_extract(payload):
+    images = _images(payload)
+    if len(images) > 1:
+        return {"results": extract.extract_batch(images)}
+    result, cache_status = extract.extract_image(images[0])
+    return {
+        "text": result["text"],
+        "pages": result["pages"],
+        "cache": cache_status,
+    }
+
+
+def _run_standardize(payload):
+    api_key = _api_key()
+    text, corrections, classification = standardize.prepare_text(
+        payload["text"])
+    body = {
+        "prefilter": classification,
+        "corrections": standardize.corrections_body(corrections),
+        "cached": False,
+        "medications": [],
+    }
+    if classification is None or \
+            classification["decision"] != "no_medication":
+        standardized_text, body["cached"] = standardize.standardize_cached(
+            text, api_key)
+        body["medications"] = standardized_text["medications"]
+    if not body["medications"]:
+        body["noMedications"] = True
+    return body
+
+
+def _run_pipeline(payload):
+    return pipeline.run_pipeline(_images(payload)[0], _api_key())
+
+
+HANDLERS = {
+    "extract": _run_extract,
+    "standardize": _run_standardize,
+    "pipeline": _run_pipeline,
+}
+
+
+def retry_delay(error, attempt):
+    """Seconds before a job that failed with error is runnable again."""
+    delay = JOB_RETRY_DELAY * 2 ** (attempt - 1)
+    if isinstance(error, upstream.CircuitOpenError):
+        delay = max(delay, standardize.BREAKER_RESET_SECONDS)
+    return delay
+
+
+def is_permanent(error):
+    """Whether a job that raised error should fail without a retry."""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return False
+    return isinstance(error, PERMANENT_ERRORS)
+
+
+def process_job(queue, job):
+    """Run one claimed job and record its result or error in the queue."""
+    started = time.perf_counter()
+    try:
+        handler = HANDLERS.get(job["kind"])
+        if handler is None:
+            raise ValueError(f"Unknown job kind: {job['kind']}")
+        result = handler(job["payload"])
+    except Exception as e:
+        if is_permanent(e):
+            logger.error(f"Job {job['id']} failed: {e}")
+            queue.fail(job["id"], e)
+            status = job_queue.FAILED
+        else:
+            delay = retry_delay(e, job["attempt"])
+            logger.error(
+                f"Job {job['id']} attempt {job['attempt']} failed: {e} "
+                f"(retry delay {delay:.0f}s)")
+            queue.fail(job["id"], e, retry=True, delay=delay)
+            status = "retry"
+    else:
+        queue.complete(job["id"], result)
+        status = job_queue.SUCCEEDED
+
+    logger.info(json.dumps({
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "attempt": job["attempt"],
+        "status": status,
+        "job_ms": round((time.perf_counter() - started) * 1000, 2),
+    }))
+    return status
+
+
+def run_worker(queue, poll_interval=JOB_POLL_INTERVAL, once=False,
+               stop=None):
+    """Claim and process jobs until stop is set (or the queue is empty when
+    once is true). Returns the number of jobs processed."""
+    stop = stop or threading.Event()
+    processed = 0
+    try:
+        while not stop.is_set():
+            job = queue.claim()
+            if job is None:
+                if once:
+                    break
+                stop.wait(poll_interval)
+                continue
+            process_job(queue, job)
+            processed += 1
+    finally:
+        standardize.close_loop()
+    return processed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--poll-interval", type=float, default=JOB_POLL_INTERVAL,
+        help="seconds to wait when the queue is empty")
+    parser.add_argument(
+        "--once", action="store_true",
+        help="exit once the queue is empty")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    processed = run_worker(
+        job_queue.get_queue(), args.poll_interval, once=args.once)
+    logger.info(f"Worker processed {processed} jobs")
+
+
+if __name__ == "__main__":
+    main()
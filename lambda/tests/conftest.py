@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The handler modules are flat files in src/, as they are in the Lambda zip.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
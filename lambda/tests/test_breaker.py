@@ -0,0 +1,132 @@
+import asyncio
+import time
+import types
+
+import httpx
+import openai
+import pytest
+
+import standardize
+import upstream
+
+
+class _Client:
+    """An AsyncOpenAI stand-in whose completions run create()."""
+
+    def __init__(self, create):
+        self.chat = types.SimpleNamespace(
+            completions=types.SimpleNamespace(create=create))
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = upstream.CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    monkeypatch.setattr(standardize, "_breaker", breaker)
+    monkeypatch.setattr(standardize, "HEDGE_PERCENTILE", 0)
+    return breaker
+
+
+def _complete(create, deadline=None):
+    return asyncio.run(standardize._complete(
+        _Client(create), "text", standardize.new_stats(), deadline))
+
+
+async def _slow(**kwargs):
+    await asyncio.sleep(1)
+
+
+async def _timed_out(**kwargs):
+    raise openai.APITimeoutError(
+        request=httpx.Request("POST", "https://api.openai.com"))
+
+
+def test_exhausted_deadline_does_not_open_the_circuit(breaker):
+    for _ in range(5):
+        with pytest.raises(upstream.DeadlineExceeded):
+            _complete(_slow, deadline=time.monotonic() + 0.01)
+
+    assert breaker.state == "closed"
+
+
+def test_no_time_left_does_not_open_the_circuit(breaker):
+    for _ in range(5):
+        with pytest.raises(upstream.DeadlineExceeded):
+            _complete(_slow, deadline=time.monotonic() - 1)
+
+    assert breaker.state == "closed"
+
+
+def test_http_timeouts_open_the_circuit(breaker):
+    for _ in range(2):
+        with pytest.raises(openai.APITimeoutError):
+            _complete(_timed_out)
+
+    assert breaker.state == "open"
+    with pytest.raises(upstream.CircuitOpenError):
+        _complete(_slow)
+
+
+def test_deadline_during_trial_frees_it(breaker, monkeypatch):
+    breaker.record_failure()
+    breaker.record_failure()
+    monkeypatch.setattr(breaker, "reset_timeout", 0)
+
+    with pytest.raises(upstream.DeadlineExceeded):
+        _complete(_slow, deadline=time.monotonic() + 0.01)
+
+    assert breaker.state == "half_open"
+    breaker.before()  # the next call gets the trial
+
+
+def test_hedge_budget_caps_the_hedge_rate():
+    budget = upstream.HedgeBudget(max_rate=0.1)
+
+    hedges = 0
+    for _ in range(100):
+        budget.record_call()
+        hedges += budget.try_hedge()
+
+    assert hedges == 10
+
+
+def _hedging(monkeypatch, max_rate):
+    latency = upstream.LatencyTracker(min_samples=1)
+    latency.record(0.02)
+    monkeypatch.setattr(standardize, "_latency", latency)
+    monkeypatch.setattr(
+        standardize, "_hedge_budget", upstream.HedgeBudget(max_rate))
+    monkeypatch.setattr(standardize, "HEDGE_PERCENTILE", 95)
+    return latency
+
+
+def _first_call_slow():
+    calls = []
+
+    async def create(**kwargs):
+        calls.append(kwargs)
+        if len(calls) == 1:
+            await asyncio.sleep(0.3)
+        return "response"
+
+    return create, calls
+
+
+def test_cancelled_attempts_are_recorded(monkeypatch):
+    latency = _hedging(monkeypatch, max_rate=1)
+    create, calls = _first_call_slow()
+
+    assert _complete(create) == "response"
+
+    assert len(calls) == 2
+    # The hedge's own latency and the cancelled first attempt's.
+    assert len(latency._samples) == 3
+    assert max(latency._samples) >= 0.02
+
+
+def test_no_hedge_past_the_budget(monkeypatch):
+    _hedging(monkeypatch, max_rate=0)
+    create, calls = _first_call_slow()
+
+    assert _complete(create) == "response"
+
+    assert len(calls) == 1
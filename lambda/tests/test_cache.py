@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+import cache
+
+
+def _files(directory):
+    return sorted(os.listdir(directory))
+
+
+@pytest.fixture
+def no_scan(monkeypatch):
+    """Fail if the cache rescans its directory after start-up."""
+    def scandir(path):
+        raise AssertionError("DiskCache rescanned its directory")
+    return lambda: monkeypatch.setattr(cache.os, "scandir", scandir)
+
+
+def test_evicts_least_recently_used_without_rescanning(tmp_path, no_scan):
+    disk = cache.DiskCache(str(tmp_path), max_bytes=250)
+    no_scan()
+    value = "x" * 98  # 100 bytes as JSON
+
+    disk.set("a", value)
+    disk.set("b", value)
+    assert disk.get("a") == value
+    disk.set("c", value)
+
+    assert _files(tmp_path) == ["a.json", "c.json"]
+    assert disk.get("b") is None
+    assert len(disk) == 2
+
+
+def test_index_is_loaded_oldest_first(tmp_path):
+    for age, key in enumerate(["new", "old"]):
+        path = tmp_path / f"{key}.json"
+        path.write_text('"' + "x" * 98 + '"')
+        os.utime(path, (1000 - age, 1000 - age))
+
+    disk = cache.DiskCache(str(tmp_path), max_bytes=202)
+    disk.set("newest", "y")
+
+    assert _files(tmp_path) == ["new.json", "newest.json"]
+
+
+def test_overwrite_replaces_the_old_size(tmp_path):
+    disk = cache.DiskCache(str(tmp_path), max_bytes=250)
+    for _ in range(5):
+        disk.set("a", "x" * 98)
+
+    assert disk.get("a") == "x" * 98
+    assert _files(tmp_path) == ["a.json"]
+
+
+def test_entries_written_elsewhere_are_indexed_on_read(tmp_path):
+    disk = cache.DiskCache(str(tmp_path), max_bytes=250)
+    other = cache.DiskCache(str(tmp_path), max_bytes=250)
+    other.set("shared", "x" * 98)
+
+    assert disk.get("shared") == "x" * 98
+    disk.set("a", "x" * 98)
+    disk.set("b", "x" * 98)
+
+    assert _files(tmp_path) == ["a.json", "b.json"]
+
+
+def test_failed_write_leaves_no_temp_file(tmp_path):
+    disk = cache.DiskCache(str(tmp_path))
+
+    with pytest.raises(TypeError):
+        disk.set("a", object())
+
+    assert _files(tmp_path) == []
+    assert disk.get("a") is None
@@ -0,0 +1,48 @@
+import pytest
+
+import drug_lexicon
+
+
+@pytest.mark.parametrize("token, expected", [
+    ("Metforrnin", "metformin"),
+    ("Clopiclogrel", "clopidogrel"),
+    ("lisin0pril", "lisinopril"),
+    ("5imvastatin", "simvastatin"),
+    ("arnl0dipine", "amlodipine"),
+])
+def test_corrects_ocr_confusions(token, expected):
+    assert drug_lexicon.correct_token(token) == expected
+
+
+# Real drugs missing from the lexicon, each a couple of edits from one that
+# is listed. Rewriting them would send the model a different drug.
+@pytest.mark.parametrize("token", [
+    "Nizatidine", "Oxazepam", "Flurazepam", "Felodipine", "Nimodipine",
+    "Pitavastatin", "Etodolac", "Loxapine",
+])
+def test_leaves_unlisted_drugs_alone(token):
+    assert drug_lexicon.correct_token(token) is None
+    text = f"{token} 10 mg tablet, take one by mouth daily"
+    assert drug_lexicon.correct_text(text) == (text, [])
+
+
+@pytest.mark.parametrize("token", [
+    "Lisnopril", "Atorvastatn", "Metoprolo1l", "tablets", "Lisinopril",
+])
+def test_no_correction_without_a_confusion(token):
+    assert drug_lexicon.correct_token(token) is None
+
+
+def test_ambiguous_readings_are_not_corrected(monkeypatch):
+    # "clarnol" reads as darnol (cl for d) or clamol (rn for m).
+    monkeypatch.setattr(
+        drug_lexicon, "DRUG_INDEX", frozenset({"darnol", "clamol"}))
+    assert drug_lexicon.correct_token("clarnol") is None
+
+
+def test_correct_text_keeps_case():
+    text, corrections = drug_lexicon.correct_text(
+        "METFORRNIN 500 mg, Lisin0pril 10 mg")
+    assert text == "METFORMIN 500 mg, Lisinopril 10 mg"
+    assert corrections == [
+        ("METFORRNIN", "METFORMIN"), ("Lisin0pril", "Lisinopril")]
@@ -0,0 +1,167 @@
+import base64
+import json
+
+import pytest
+
+import extract
+
+PNG = b"\x89PNG\r\n\x1a\n first"
+JPEG = b"\xff\xd8\xff second"
+BOUNDARY = "----form1234"
+
+
+def _event(body, content_type, encoded=True):
+    if encoded:
+        body = base64.b64encode(body).decode("ascii")
+    return {
+        "headers": {"Content-Type": content_type},
+        "body": body,
+        "isBase64Encoded": encoded,
+    }
+
+
+def _multipart(*parts):
+    """A multipart/form-data event from (disposition, content) parts."""
+    body = b""
+    for disposition, content in parts:
+        body += (
+            f"--{BOUNDARY}\r\n"
+            f"Content-Disposition: form-data; {disposition}\r\n"
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode() + content + b"\r\n"
+    body += f"--{BOUNDARY}--\r\n".encode()
+    return _event(body, f'multipart/form-data; boundary="{BOUNDARY}"')
+
+
+def _data_url(image):
+    return "data:image/png;base64," + base64.b64encode(image).decode()
+
+
+@pytest.mark.parametrize("content_type", [
+    "image/png", "image/jpeg; charset=binary", "application/octet-stream",
+])
+def test_raw_upload(content_type):
+    assert extract.parse_request(_event(PNG, content_type)) == ([PNG], False)
+
+
+def test_multipart_single_image():
+    event = _multipart(('name="image"; filename="scan.png"', PNG))
+
+    assert extract.parse_request(event) == ([PNG], False)
+
+
+def test_multipart_image_field_wins_over_other_files():
+    event = _multipart(
+        ('name="attachment"; filename="other.jpg"', JPEG),
+        ('name="image"; filename="scan.png"', PNG))
+
+    assert extract.parse_request(event) == ([PNG], False)
+
+
+def test_multipart_files_named_image_are_a_batch():
+    # filename="image" must not be mistaken for the name="image" field.
+    event = _multipart(
+        ('name="images"; filename="image"', PNG),
+        ('name="images"; filename="image"', JPEG))
+
+    assert extract.parse_request(event) == ([PNG, JPEG], True)
+
+
+def test_multipart_single_images_part_is_a_batch():
+    event = _multipart(("name=images; filename=scan.png", PNG))
+
+    assert extract.parse_request(event) == ([PNG], True)
+
+
+def test_multipart_unnamed_files_are_a_batch():
+    event = _multipart(
+        ('name="file1"; filename="a.png"', PNG),
+        ('name="file2"; filename="b.jpg"', JPEG),
+        ('name="note"', b"not a file"))
+
+    assert extract.parse_request(event) == ([PNG, JPEG], True)
+
+
+def test_multipart_without_files():
+    with pytest.raises(ValueError, match="No image data"):
+        extract.parse_request(_multipart(('name="note"', b"text")))
+
+
+def test_multipart_without_boundary():
+    with pytest.raises(ValueError, match="boundary"):
+        extract.parse_request(_event(b"--x\r\n", "multipart/form-data"))
+
+
+@pytest.mark.parametrize("encoded", [False, True])
+def test_json_image(encoded):
+    body = json.dumps({"image": _data_url(PNG)}).encode()
+    event = _event(body, "application/json", encoded)
+    if not encoded:
+        event["body"] = body.decode()
+
+    assert extract.parse_request(event) == ([PNG], False)
+
+
+def test_json_bare_base64_image():
+    event = {"body": {"image": base64.b64encode(PNG).decode()}}
+
+    assert extract.parse_request(event) == ([PNG], False)
+
+
+def test_json_batch_keeps_bad_entries_in_place():
+    event = {"body": json.dumps({
+        "images": [_data_url(PNG), "data:image/png;base64", _data_url(JPEG)],
+    })}
+
+    images, batch = extract.parse_request(event)
+
+    assert batch
+    assert images[0] == PNG
+    assert isinstance(images[1], ValueError)
+    assert images[2] == JPEG
+
+
+@pytest.mark.parametrize("body", [
+    {"images": []}, {"images": "not a list"}, {"image": ""}, {},
+])
+def test_json_without_images(body):
+    with pytest.raises(ValueError):
+        extract.parse_request({"body": json.dumps(body)})
+
+
+def test_empty_body():
+    with pytest.raises(ValueError, match="No body"):
+        extract.parse_request({"body": ""})
+
+
+def _emf_line(capsys):
+    lines = [line for line in capsys.readouterr().out.splitlines()
+             if line.startswith('{"_aws"')]
+    assert len(lines) == 1
+    return json.loads(lines[0])
+
+
+def test_failed_request_prints_metrics(capsys):
+    body = {"image": "data:image/png;base64"}
+
+    response = extract.lambda_handler({"body": body}, None)
+
+    assert response["statusCode"] == 500
+    metrics = _emf_line(capsys)
+    assert metrics["status"] == 500
+    assert metrics["error_type"] == "ValueError"
+    assert metrics["body_bytes"] == len(json.dumps(body))
+    assert "total_ms" in metrics
+
+
+@pytest.mark.parametrize("event", [
+    _event(PNG * 5, "image/png"),
+    _event(PNG * 5 + b"x", "image/png"),
+    _event(PNG * 5 + b"xy", "image/png"),
+    {"body": (PNG * 5).decode("latin-1"), "isBase64Encoded": False},
+], ids=["base64", "base64-padded-1", "base64-padded-2", "text"])
+def test_body_bytes_is_the_uploaded_size(event):
+    size = len(base64.b64decode(event["body"])) \
+        if event.get("isBase64Encoded") else len(event["body"].encode())
+
+    assert extract._body_bytes(event) == size
@@ -0,0 +1,72 @@
+import io
+
+import pytest
+from PIL import Image
+
+import imaging
+
+
+def _encode(image, fmt, **params):
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, dpi=(600, 600), **params)
+    return buffer.getvalue()
+
+
+def _bilevel():
+    image = Image.new("1", (1200, 1600), 1)
+    image.paste(0, (100, 100, 1100, 200))
+    return image
+
+
+def _palette(colours):
+    image = Image.new("P", (1200, 1600), 0)
+    image.putpalette(colours)
+    image.paste(1, (100, 100, 1100, 200))
+    return image
+
+
+def _sixteen_bit(mode):
+    image = Image.new(mode, (1200, 1600), 60000)
+    image.paste(Image.new(mode, (1000, 100), 1000), (100, 100))
+    return image
+
+
+# 600 DPI scans in the modes Image.reduce rejects, as they arrive encoded.
+@pytest.mark.parametrize("data, expected_mode", [
+    (_encode(_bilevel(), "TIFF", compression="group4"), "L"),
+    (_encode(_palette([0, 0, 0, 255, 255, 255]), "PNG"), "L"),
+    (_encode(_palette([255, 255, 255, 200, 0, 0]), "PNG"), "RGB"),
+    (_encode(_palette([255, 255, 255, 0, 0, 0]), "PNG", transparency=0),
+     "LA"),
+    (_encode(_sixteen_bit("I;16"), "TIFF"), "L"),
+    (_encode(_sixteen_bit("I;16"), "PNG"), "L"),
+], ids=["group4-tiff", "grey-palette", "colour-palette",
+        "transparent-palette", "16bit-tiff", "16bit-png"])
+def test_normalize_reduces_every_mode(data, expected_mode):
+    image = imaging.normalize(imaging.open_image(data))
+
+    assert image.mode == expected_mode
+    assert image.size == (600, 800)
+    assert round(image.info["dpi"][0]) == 300
+
+
+@pytest.mark.parametrize("paper, ink", [
+    (60000, 1000),  # 16-bit
+    (4095, 0),      # 12-bit, as many scanners write
+    (1023, 200),    # 10-bit
+])
+def test_sixteen_bit_is_scaled_by_its_brightest_value(paper, ink):
+    image = Image.new("I;16", (1200, 1600), paper)
+    image.paste(Image.new("I;16", (1000, 100), ink), (100, 100))
+
+    image = imaging.to_8bit(image)
+
+    assert image.mode == "L"
+    assert image.getpixel((0, 0)) == 255
+    assert image.getpixel((500, 150)) == round(ink * 255 / paper)
+
+
+def test_eight_bit_values_in_sixteen_bits_are_kept():
+    image = imaging.to_8bit(Image.new("I;16", (4, 4), 200))
+
+    assert image.getpixel((0, 0)) == 200
@@ -0,0 +1,82 @@
+"""Import-time budget for the Lambda handler modules.
+
+Module import runs during every cold start, so these tests fail if a handler
+starts importing something heavy at load time again (the openai SDK, or all
+of Pillow's format plugins). Each check runs in a fresh interpreter.
+
+    python -m pytest lambda/tests
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+SRC = os.path.join(os.path.dirname(__file__), "..", "src")
+
+# Cumulative import time in milliseconds, with headroom for slow machines.
+# Importing the openai SDK alone takes longer than the standardize budget.
+IMPORT_BUDGET_MS = {
+    "extract": 200,
+    "standardize": 200,
+    "pipeline": 300,
+}
+
+ACCEPTED_PLUGINS = {
+    "PIL.BmpImagePlugin",
+    "PIL.JpegImagePlugin",
+    "PIL.PngImagePlugin",
+    "PIL.TiffImagePlugin",
+    "PIL.WebPImagePlugin",
+}
+
+
+def _python(*args):
+    env = dict(os.environ, OCR_ENGINE="subprocess")
+    env.pop("IMAGE_PLUGINS", None)
+    result = subprocess.run(
+        [sys.executable, *args], cwd=SRC, env=env,
+        capture_output=True, text=True, check=True)
+    return result
+
+
+def _import_ms(module):
+    """Cumulative import time of module as reported by -X importtime."""
+    stderr = _python("-X", "importtime", "-c", f"import {module}").stderr
+    for line in stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1000
+    raise AssertionError(f"No import time reported for {module}")
+
+
+@pytest.mark.parametrize("module", sorted(IMPORT_BUDGET_MS))
+def test_import_time_budget(module):
+    # Best of three, so one slow run on a busy machine does not fail it.
+    elapsed = min(_import_ms(module) for _ in range(3))
+    assert elapsed < IMPORT_BUDGET_MS[module], \
+        f"import {module} took {elapsed:.0f} ms"
+
+
+@pytest.mark.parametrize("module", ["standardize", "pipeline"])
+def test_openai_is_imported_lazily(module):
+    stdout = _python("-c", (
+        f"import sys, {module}; "
+        "print(sorted(m for m in ('openai', 'httpx') if m in sys.modules))"
+    )).stdout
+    # extract prints its Tesseract self-check first.
+    assert stdout.splitlines()[-1] == "[]"
+
+
+def test_only_accepted_image_plugins_are_loaded():
+    stdout = _python("-c", (
+        "import io, sys\n"
+        "import imaging\n"
+        "from PIL import Image\n"
+        "for fmt in ('JPEG', 'PNG', 'TIFF', 'WEBP', 'BMP'):\n"
+        "    buffer = io.BytesIO()\n"
+        "    Image.new('RGB', (8, 8)).save(buffer, fmt)\n"
+        "    assert imaging.open_image(buffer.getvalue()).format == fmt\n"
+        "print('\\n'.join(m for m in sys.modules if m.endswith('Plugin')))\n"
+    )).stdout
+    assert set(stdout.split()) == ACCEPTED_PLUGINS
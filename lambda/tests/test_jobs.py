@@ -0,0 +1,157 @@
+import asyncio
+import base64
+import json
+import sqlite3
+
+import httpx
+import pytesseract
+import pytest
+
+import job_queue
+import server
+import upstream
+import worker
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    queue = job_queue.SQLiteJobQueue(
+        str(tmp_path / "jobs.sqlite3"), max_attempts=3)
+    monkeypatch.setattr(job_queue, "_queue", queue)
+    return queue
+
+
+def test_job_queue_is_abstract():
+    with pytest.raises(TypeError):
+        job_queue.JobQueue()
+
+
+def test_retried_job_waits_for_its_delay(queue, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(job_queue.time, "time", lambda: clock[0])
+    job_id = queue.submit("standardize", {"text": "x"})
+
+    job = queue.claim()
+    queue.fail(job_id, "circuit open", retry=True, delay=30)
+    assert queue.claim() is None
+    assert queue.get(job_id)["status"] == job_queue.QUEUED
+
+    clock[0] += 30
+    assert queue.claim()["attempt"] == job["attempt"] + 1
+
+
+def test_open_circuit_does_not_burn_attempts(queue, monkeypatch):
+    def circuit_open(payload):
+        raise upstream.CircuitOpenError("OpenAI circuit is open")
+
+    monkeypatch.setitem(worker.HANDLERS, "standardize", circuit_open)
+    monkeypatch.setattr(worker.standardize, "BREAKER_RESET_SECONDS", 30)
+    job_id = queue.submit("standardize", {"text": "x"})
+
+    processed = worker.run_worker(queue, once=True)
+
+    assert processed == 1
+    job = queue.get(job_id)
+    assert job["status"] == job_queue.QUEUED
+    assert job["attempts"] == 1
+
+
+def test_retry_delay_backs_off(monkeypatch):
+    monkeypatch.setattr(worker, "JOB_RETRY_DELAY", 5)
+    monkeypatch.setattr(worker.standardize, "BREAKER_RESET_SECONDS", 30)
+
+    assert worker.retry_delay(RuntimeError(), 1) == 5
+    assert worker.retry_delay(RuntimeError(), 3) == 20
+    assert worker.retry_delay(upstream.CircuitOpenError(), 1) == 30
+    assert worker.retry_delay(upstream.CircuitOpenError(), 4) == 40
+
+
+def test_queue_files_without_available_at_are_migrated(tmp_path):
+    path = str(tmp_path / "old.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE jobs (id TEXT PRIMARY KEY, kind TEXT NOT NULL,"
+        " payload TEXT NOT NULL, status TEXT NOT NULL, result TEXT,"
+        " error TEXT, attempts INTEGER NOT NULL DEFAULT 0,"
+        " lease_expires_at REAL, created_at REAL NOT NULL,"
+        " updated_at REAL NOT NULL)")
+    conn.execute(
+        "INSERT INTO jobs (id, kind, payload, status, created_at, updated_at)"
+        " VALUES ('a', 'standardize', '{}', 'queued', 1, 1)")
+    conn.commit()
+    conn.close()
+
+    assert job_queue.SQLiteJobQueue(path).claim()["id"] == "a"
+
+
+def test_server_serves_the_job_api(queue):
+    async def requests():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(
+                transport=transport, base_url="http://test") as client:
+            submitted = await client.post(
+                "/jobs", json={"text": "Lisinopril 10 mg daily"})
+            job_id = submitted.json()["jobId"]
+            queue.complete(job_id, {"medications": []})
+            status = await client.get(f"/jobs/{job_id}")
+            events = await client.get(f"/jobs/{job_id}/events")
+            missing = await client.get("/jobs/unknown")
+            wrong_method = await client.put("/jobs")
+            return submitted, status, events, missing, wrong_method
+
+    submitted, status, events, missing, wrong_method = asyncio.run(
+        requests())
+
+    assert submitted.status_code == 202
+    assert submitted.json()["kind"] == "standardize"
+    assert status.status_code == 200
+    assert status.json()["status"] == job_queue.SUCCEEDED
+    assert events.headers["content-type"] == "text/event-stream"
+    assert "event: done" in events.text
+    assert json.loads(events.text.split("data: ")[-1])["result"] == {
+        "medications": []}
+    assert missing.status_code == 404
+    assert wrong_method.status_code == 405
+
+
+def _tesseract_rejects(payload):
+    raise pytesseract.TesseractError(1, "Image too small to scale")
+
+
+def _connection_reset(payload):
+    raise ConnectionResetError("Connection reset by peer")
+
+
+@pytest.mark.parametrize("kind, payload", [
+    ("extract", {"images": [base64.b64encode(b"not an image").decode()]}),
+    ("pipeline", {"images": [base64.b64encode(
+        b"\x89PNG\r\n\x1a\n truncated").decode()]}),
+])
+def test_undecodable_uploads_fail_without_a_retry(queue, monkeypatch, kind,
+                                                  payload):
+    monkeypatch.setenv("OPENAI_API_KEY", "key")
+    job_id = queue.submit(kind, payload)
+
+    worker.run_worker(queue, once=True)
+
+    job = queue.get(job_id)
+    assert job["status"] == job_queue.FAILED
+    assert job["attempts"] == 1
+
+
+def test_tesseract_errors_fail_without_a_retry(queue, monkeypatch):
+    monkeypatch.setitem(worker.HANDLERS, "extract", _tesseract_rejects)
+    job_id = queue.submit("extract", {"images": ["eA=="]})
+
+    worker.run_worker(queue, once=True)
+
+    assert queue.get(job_id)["status"] == job_queue.FAILED
+
+
+def test_connection_errors_are_retried(queue, monkeypatch):
+    monkeypatch.setitem(worker.HANDLERS, "extract", _connection_reset)
+    job_id = queue.submit("extract", {"images": ["eA=="]})
+
+    worker.run_worker(queue, once=True)
+
+    assert queue.get(job_id)["status"] == job_queue.QUEUED
@@ -0,0 +1,147 @@
+import threading
+
+import pytest
+from PIL import Image
+
+import ocr
+
+
+class _Function:
+    restype = None
+    argtypes = None
+
+
+def _stub_lib(missing=()):
+    """A stand-in for a CDLL exposing every symbol except missing ones."""
+    class Lib:
+        def __getattr__(self, name):
+            if name in missing:
+                raise AttributeError(f"undefined symbol: {name}")
+            function = _Function()
+            setattr(self, name, function)
+            return function
+    return Lib()
+
+
+def test_library_missing_a_symbol_is_skipped(monkeypatch):
+    old = _stub_lib(missing={"TessBaseAPISetSourceResolution"})
+    new = _stub_lib()
+    loaded = iter([old, new])
+    monkeypatch.setattr(ocr.ctypes, "CDLL", lambda path: next(loaded))
+    monkeypatch.setattr(ocr.glob, "glob", lambda pattern: [])
+
+    assert ocr._load_library() is new
+
+
+def test_library_without_tsv_is_used(monkeypatch):
+    # Tesseract 3.04, as built for the layer, has no GetTsvText.
+    lib = _stub_lib(missing={"TessBaseAPIGetTsvText"})
+    monkeypatch.setattr(ocr.ctypes, "CDLL", lambda path: lib)
+    monkeypatch.setattr(ocr.glob, "glob", lambda pattern: [])
+
+    assert ocr._load_library() is lib
+    assert not ocr.has_tsv(lib)
+
+
+def test_no_usable_library_raises_engine_error(monkeypatch):
+    monkeypatch.setattr(
+        ocr.ctypes, "CDLL",
+        lambda path: _stub_lib(missing={"TessBaseAPIGetUTF8Text"}))
+    monkeypatch.setattr(ocr.glob, "glob", lambda pattern: [])
+
+    with pytest.raises(ocr.TesseractEngineError):
+        ocr._load_library()
+
+
+class _EngineLib:
+    """Records the TessBaseAPI calls an engine makes."""
+
+    def __init__(self, known_variables=()):
+        self.calls = []
+        self.known_variables = known_variables
+
+    def TessBaseAPICreate(self):
+        return 1
+
+    def TessBaseAPIInit3(self, handle, datapath, lang):
+        return 0
+
+    def TessBaseAPISetPageSegMode(self, handle, psm):
+        pass
+
+    def TessBaseAPISetVariable(self, handle, name, value):
+        return name.decode() in self.known_variables
+
+    def TessBaseAPIEnd(self, handle):
+        self.calls.append("End")
+
+    def TessBaseAPIDelete(self, handle):
+        self.calls.append("Delete")
+
+
+def test_engine_with_an_unknown_variable_is_released():
+    lib = _EngineLib()
+
+    with pytest.raises(ocr.TesseractEngineError, match="Unknown variable"):
+        ocr.TesseractEngine(lib, config="-c no_such_variable=1")
+
+    assert lib.calls == ["End", "Delete"]
+
+
+def test_image_to_data_uses_the_binary_without_tsv(monkeypatch):
+    engine = ocr.TesseractEngine(_EngineLib())
+    monkeypatch.setattr(ocr, "get_engine", lambda lang, config: engine)
+    monkeypatch.setattr(
+        ocr, "run_and_get_output",
+        lambda image, extension, lang, config: f"binary {extension}")
+
+    assert not engine.supports_tsv
+    assert ocr.image_to_data(Image.new("L", (4, 4))) == "binary tsv"
+
+
+@pytest.mark.parametrize("mode", ["RGBA", "LA", "PA"])
+def test_engine_image_composites_transparency_onto_white(mode):
+    image = Image.new(mode, (4, 4))
+
+    prepared = ocr.engine_image(image)
+
+    assert prepared.mode == "RGB"
+    assert prepared.getpixel((0, 0)) == (255, 255, 255)
+
+
+@pytest.mark.parametrize("mode, expected", [
+    ("L", "L"), ("RGB", "RGB"), ("1", "RGB"), ("CMYK", "RGB"),
+])
+def test_engine_image_modes(mode, expected):
+    assert ocr.engine_image(Image.new(mode, (4, 4))).mode == expected
+
+
+def _record_threads(monkeypatch):
+    threads = []
+
+    def image_to_string(image, lang, config, timer):
+        threads.append(threading.current_thread())
+        return "text"
+
+    monkeypatch.setattr(ocr, "image_to_string", image_to_string)
+    return threads
+
+
+def test_single_page_is_ocred_on_the_pool(monkeypatch):
+    threads = _record_threads(monkeypatch)
+
+    assert ocr.image_to_string_pages(Image.new("L", (4, 4))) == ["text"]
+
+    assert threads[0].name.startswith("ocr")
+
+
+def test_single_page_from_the_pool_runs_inline(monkeypatch):
+    threads = _record_threads(monkeypatch)
+    # With every pool thread busy, handing the page over would deadlock.
+    pool = ocr.get_executor()
+    busy = [pool.submit(ocr.image_to_string_pages, Image.new("L", (4, 4)))
+            for _ in range(ocr.OCR_WORKERS)]
+
+    assert [future.result(timeout=5) for future in busy] == \
+        [["text"]] * ocr.OCR_WORKERS
+    assert all(thread.name.startswith("ocr") for thread in threads)
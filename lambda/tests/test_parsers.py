@@ -0,0 +1,154 @@
+import json
+
+import pytest
+
+import compact_format
+import json_stream
+
+MED = {
+    "medication": "Amoxicillin",
+    "sig_code": "1 CAP PO Q8H",
+    "dosage": "500 mg",
+    "frequency": "every 8 hours",
+    "quantity": "30 capsules",
+    "refills": "None",
+    "purpose": None,
+}
+OTHER = dict(MED, medication="Lisinopril", sig_code="1 TAB PO QD")
+ARRAY = json.dumps([MED, OTHER])
+
+
+@pytest.mark.parametrize("text", [
+    ARRAY,
+    json.dumps({"medications": [MED, OTHER]}),
+    f"```json\n{ARRAY}\n```",
+    f"Here are the medications:\n{ARRAY}\nLet me know if you need more.",
+    f"Here are the meds [1 found]:\n```json\n{ARRAY}```",
+    f"Found [2] medications (see [notes]):\n{ARRAY}",
+    f"The list [] follows:\n{ARRAY}",
+], ids=["plain", "object", "fenced", "prose", "bracket-in-prose",
+        "number-array-in-prose", "empty-array-in-prose"])
+def test_extract_array(text):
+    assert json_stream.extract_array(text) == [MED, OTHER]
+
+
+def test_extract_array_returns_an_empty_array():
+    assert json_stream.extract_array("No medications found: []") == []
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    "No medications [none found].",
+    f"```json\n{ARRAY[:-10]}",
+])
+def test_extract_array_without_a_complete_array(text):
+    with pytest.raises(ValueError):
+        json_stream.extract_array(text)
+
+
+def _feed_in_chunks(parser, text, size):
+    objects = []
+    for start in range(0, len(text), size):
+        objects += parser.feed(text[start:start + size])
+    return objects
+
+
+@pytest.mark.parametrize("size", [1, 7, 1000])
+@pytest.mark.parametrize("text", [
+    ARRAY,
+    f"```json\n{ARRAY}\n```",
+    f"Here are the meds [1 found]:\n```json\n{ARRAY}```",
+    f"Notes [\"see below\"]:\n{ARRAY}",
+], ids=["plain", "fenced", "bracket-in-prose", "string-array-in-prose"])
+def test_array_parser_yields_objects_as_they_close(text, size):
+    parser = json_stream.ArrayParser()
+
+    assert _feed_in_chunks(parser, text, size) == [MED, OTHER]
+    assert parser.finished
+
+
+def test_array_parser_yields_each_object_before_the_array_ends():
+    parser = json_stream.ArrayParser()
+    first_end = ARRAY.index("}") + 1
+
+    assert parser.feed(ARRAY[:first_end]) == [MED]
+    assert parser.feed(ARRAY[first_end:]) == [OTHER]
+
+
+def test_array_parser_handles_brackets_and_escapes_in_strings():
+    med = dict(MED, purpose='for "pain" [as needed] {not daily}\\')
+    parser = json_stream.ArrayParser()
+
+    assert _feed_in_chunks(parser, json.dumps([med]), 3) == [med]
+
+
+def test_array_parser_ignores_text_after_the_array():
+    parser = json_stream.ArrayParser()
+
+    assert parser.feed(f"{ARRAY}\nAlso [{{\"x\": 1}}]") == [MED, OTHER]
+    assert parser.feed("[{}]") == []
+
+
+def test_array_parser_without_an_array():
+    parser = json_stream.ArrayParser()
+
+    assert parser.feed("No medications [none found].") == []
+    assert not parser.started
+
+
+COMPACT = (
+    "Amoxicillin|1 CAP PO Q8H|500 mg|every 8 hours|30 capsules|None|-\n"
+    "Lisinopril|1 TAB PO QD|500 mg|every 8 hours|30 capsules|None|-\n"
+)
+
+
+@pytest.mark.parametrize("text", [
+    COMPACT,
+    f"```\n{COMPACT}```",
+    "medication|sig_code|dosage|frequency|quantity|refills|purpose\n"
+    + COMPACT,
+    "Here are the medications:\n\n" + COMPACT.replace("\n", "\r\n"),
+    "".join(f"|{line}|\n" for line in COMPACT.splitlines()),
+], ids=["plain", "fenced", "header", "prose-crlf", "outer-separators"])
+def test_compact_decode(text):
+    assert compact_format.validate(compact_format.decode(text)) == [
+        MED, OTHER]
+
+
+def test_compact_decode_maps_blanks_and_dashes_to_null():
+    (med,) = compact_format.decode("Aspirin| |81 mg|-|||-")
+
+    assert med == dict.fromkeys(compact_format.FIELDS) | {
+        "medication": "Aspirin", "dosage": "81 mg"}
+
+
+def test_compact_decode_rejects_a_wrong_field_count():
+    with pytest.raises(ValueError, match="Expected 7 fields"):
+        compact_format.decode("Aspirin|81 mg|daily")
+
+
+def test_compact_decode_without_medications():
+    assert compact_format.decode("") == []
+    assert compact_format.decode("No medications found.") == []
+
+
+@pytest.mark.parametrize("size", [1, 5, 1000])
+def test_stream_decoder_yields_each_complete_line(size):
+    decoder = compact_format.StreamDecoder()
+    text = COMPACT.rstrip("\n")
+
+    meds = []
+    for start in range(0, len(text), size):
+        meds += decoder.feed(text[start:start + size])
+    # The last line has no newline until close().
+    assert meds == [MED]
+    assert decoder.close() == [OTHER]
+    assert decoder.close() == []
+
+
+def test_stream_decoder_skips_noise_lines():
+    decoder = compact_format.StreamDecoder()
+
+    assert decoder.feed("```\nHere you go:\n") == []
+    assert decoder.feed(COMPACT + "```") == [MED, OTHER]
+    assert decoder.close() == []
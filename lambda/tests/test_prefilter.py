@@ -0,0 +1,31 @@
+import pytest
+
+import prefilter
+
+
+# Prescriptions whose drug is missing from the lexicon and whose directions
+# use forms and routes other than tablets by mouth.
+@pytest.mark.parametrize("text", [
+    "Flonase 2 sprays in each nostril once a day",
+    "Xalatan 1 drop in each eye at bedtime",
+    "Zyrtec one tab daily",
+    "Ventolin HFA 2 puffs every 4 hours as needed",
+    "Lantus 20 units subcutaneously nightly",
+    "Voltaren gel apply to the skin twice a day",
+    "Amoxicillin 250 mg/5 ml",
+    "Lisinopril",
+])
+def test_prescriptions_go_to_the_model(text):
+    assert prefilter.classify(text)["decision"] == "medication"
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    "   \n\n",
+    "Blue Cross Blue Shield\nMember ID XYZ123456789\nGroup 01234",
+    "TOTAL $12.99\nVISA ending 4242\nThank you for shopping with us",
+])
+def test_text_without_any_signal_is_skipped(text):
+    result = prefilter.classify(text)
+    assert result["decision"] == "no_medication"
+    assert result["score"] == 0
@@ -0,0 +1,95 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import server
+import standardize
+
+TEXT = "Lisinopril 10 mg tablet, take one by mouth daily"
+FIRST = {"medication": "Lisinopril"}
+SECOND = {"medication": "Metformin"}
+
+
+def _request(path, body, headers=()):
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": path,
+        "headers": [
+            (b"content-type", b"application/json"), *headers],
+        "query_string": b"",
+    }
+    messages = [{"type": "http.request", "body": json.dumps(body).encode()}]
+
+    async def receive():
+        return messages.pop(0)
+
+    return scope, receive
+
+
+def test_stream_mode_standardize_sends_each_line(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "key")
+    monkeypatch.setattr(standardize, "RESULT_CACHE", None)
+    first_sent = threading.Event()
+
+    def stream_medications(text, api_key, deadline=None):
+        yield FIRST
+        # Buffering the body would wait here until the timeout.
+        assert first_sent.wait(5)
+        yield SECOND
+
+    monkeypatch.setattr(
+        standardize, "stream_medications", stream_medications)
+    scope, receive = _request(
+        "/standardize", {"text": TEXT},
+        [(b"accept", b"application/x-ndjson")])
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+        if FIRST["medication"].encode() in message.get("body", b""):
+            first_sent.set()
+
+    asyncio.run(server.app(scope, receive, send))
+
+    start, *bodies = sent
+    assert start["status"] == 200
+    assert (b"content-type", b"application/x-ndjson") in start["headers"]
+    lines = [json.loads(m["body"]) for m in bodies if m["body"]]
+    assert lines == [FIRST, SECOND, {"done": True, "count": 2}]
+    assert [m.get("more_body", False) for m in bodies] == [
+        True, True, True, False]
+    assert server.ROUTES["/standardize"][1].active == 0
+
+
+def test_broken_ocr_pool_is_shut_down_off_the_loop(monkeypatch):
+    shutdown_threads = []
+
+    class BrokenPool(ThreadPoolExecutor):
+        def submit(self, fn, *args):
+            raise BrokenProcessPool("A worker died")
+
+    monkeypatch.setattr(server, "get_pool", BrokenPool)
+    monkeypatch.setattr(
+        server, "shutdown_pool",
+        lambda: shutdown_threads.append(threading.current_thread()))
+
+    response = asyncio.run(server.handle_extract({}))
+
+    assert response["statusCode"] == 503
+    assert shutdown_threads[0] is not threading.main_thread()
+
+
+def test_job_api_runs_on_its_own_threads(monkeypatch):
+    monkeypatch.setattr(
+        server.jobs, "lambda_handler",
+        lambda event, context: threading.current_thread().name)
+
+    try:
+        thread_name = asyncio.run(server.handle_jobs({}))
+    finally:
+        server.shutdown_jobs_executor()
+
+    assert thread_name.startswith("jobs-api")
@@ -0,0 +1,82 @@
+import pytest
+
+import sig_rules
+
+AMOXICILLIN = (
+    "Amoxicillin 250 mg/5 ml\n"
+    "Take 1 teaspoon by mouth every 8 hours\n"
+    "Quantity 150 ml\n"
+    "Refills: 0"
+)
+
+
+@pytest.mark.parametrize("text, expected", [
+    (AMOXICILLIN, [AMOXICILLIN]),
+    ("Lisinopril 10 mg tablet\nTake 1 tablet by mouth daily\n"
+     "Metformin 500 mg tablet\nTake 1 tablet by mouth twice daily",
+     ["Lisinopril 10 mg tablet\nTake 1 tablet by mouth daily",
+      "Metformin 500 mg tablet\nTake 1 tablet by mouth twice daily"]),
+    ("Dr. Smith\nLisinopril 10 mg\nTake 1 tablet by mouth daily",
+     ["Dr. Smith", "Lisinopril 10 mg\nTake 1 tablet by mouth daily"]),
+    ("Lisinopril 10 mg\nQty 30 tablets\nDispense 90 tabs\nRefills 3",
+     ["Lisinopril 10 mg\nQty 30 tablets\nDispense 90 tabs\nRefills 3"]),
+    ("Lisinopril 10 mg\nTake ibuprofen 200 mg",
+     ["Lisinopril 10 mg\nTake ibuprofen 200 mg"]),
+], ids=["quantity-with-unit", "two-drugs", "preamble", "supply-lines",
+        "verb-line"])
+def test_split_blocks(text, expected):
+    assert sig_rules.split_blocks(text) == expected
+
+
+@pytest.mark.parametrize("line, name", [
+    ("Lisinopril 10 mg tablet", "Lisinopril"),
+    ("Rx: Amoxicillin 500 mg capsules", "Amoxicillin"),
+    ("Insulin glargine 100 units/ml", "Insulin glargine"),
+    ("Take ibuprofen 200 mg", None),
+    ("Apply hydrocortisone 1%", None),
+    ("Use albuterol 90 mcg", None),
+    ("Sig lisinopril 10 mg", None),
+    ("Quantity 150 ml", None),
+    ("Dispense 90 mg", None),
+])
+def test_medication_line(line, name):
+    match = sig_rules.MEDICATION_RE.match(line)
+    assert (match["name"] if match else None) == name
+
+
+@pytest.mark.parametrize("block, expected", [
+    (AMOXICILLIN, {
+        "medication": "Amoxicillin",
+        "sig_code": "1 TSP PO Q8H",
+        "dosage": "250 mg/5 ml",
+        "frequency": "every 8 hours",
+        "quantity": "150 ml",
+        "refills": "None",
+        "purpose": None,
+    }),
+    ("Lisinopril 10 mg tablet\nTake 1 tablet by mouth daily\n"
+     "Qty: 30 Refills: 2", {
+        "medication": "Lisinopril",
+        "sig_code": "1 TAB PO QD",
+        "dosage": "10 mg",
+        "frequency": "daily",
+        "quantity": "30",
+        "refills": "2",
+        "purpose": None,
+    }),
+    ("Take ibuprofen 200 mg\nevery 6 hours", None),
+    ("Quantity 150 ml\nRefills: 0", None),
+    ("Lisinopril 10 mg tablet\nTake as directed", None),
+], ids=["amoxicillin", "lisinopril", "verb-header", "orphan-supply",
+        "unparsed-sig"])
+def test_parse_block(block, expected):
+    assert sig_rules.parse_block(block) == expected
+
+
+def test_supply_lines_stay_with_their_drug():
+    segments = sig_rules.fast_path("Dr. Smith\n" + AMOXICILLIN)
+
+    assert len(segments) == 1
+    block, medication = segments[0]
+    assert block == AMOXICILLIN
+    assert medication["quantity"] == "150 ml"
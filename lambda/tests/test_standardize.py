@@ -0,0 +1,113 @@
+import asyncio
+import json
+import threading
+import types
+
+import pytest
+
+import standardize
+
+
+def test_run_works_from_several_threads_at_once():
+    both_running = threading.Barrier(2, timeout=5)
+    results = []
+
+    async def job(name):
+        await asyncio.get_running_loop().run_in_executor(
+            None, both_running.wait)
+        return name, asyncio.get_running_loop()
+
+    def work(name):
+        try:
+            results.append(standardize.run(job(name)))
+        finally:
+            standardize.close_loop()
+
+    threads = [
+        threading.Thread(target=work, args=(name,)) for name in "ab"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(name for name, _ in results) == ["a", "b"]
+    assert results[0][1] is not results[1][1]
+
+
+class _AsyncOpenAI:
+    def __init__(self, api_key, **kwargs):
+        self.api_key = api_key
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+def test_each_loop_keeps_its_own_async_client(monkeypatch):
+    monkeypatch.setattr(
+        standardize, "_openai",
+        lambda: types.SimpleNamespace(AsyncOpenAI=_AsyncOpenAI))
+
+    async def client(api_key):
+        return standardize.get_async_client(api_key)
+
+    loops = [asyncio.new_event_loop() for _ in range(2)]
+    try:
+        first = [loop.run_until_complete(client("a")) for loop in loops]
+        again = [loop.run_until_complete(client("a")) for loop in loops]
+        assert first == again
+        assert first[0] is not first[1]
+
+        rotated = loops[0].run_until_complete(client("b"))
+        loops[0].run_until_complete(asyncio.sleep(0))
+        assert rotated.api_key == "b"
+        assert first[0].closed
+        assert not first[1].closed
+    finally:
+        for loop in loops:
+            loop.close()
+
+
+def test_failed_block_cancels_the_others(monkeypatch):
+    finished = []
+
+    async def standardize_text_async(block, api_key, stats, deadline):
+        if block == "bad":
+            raise ValueError("Invalid compact response from OpenAI")
+        await asyncio.sleep(0.05)
+        finished.append(block)
+        return []
+
+    monkeypatch.setattr(
+        standardize, "standardize_text_async", standardize_text_async)
+
+    with pytest.raises(ValueError):
+        standardize.run(standardize.standardize_blocks_async(
+            ["Good one", "bad"], "key"))
+    # The next invocation on the same loop must not complete the old block.
+    standardize.run(asyncio.sleep(0.1))
+
+    assert finished == []
+
+
+def test_lambda_buffers_stream_mode_lines(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "key")
+    monkeypatch.setattr(standardize, "RESULT_CACHE", None)
+
+    def stream_medications(text, api_key, deadline=None):
+        yield {"medication": "Lisinopril"}
+        raise standardize.upstream.DeadlineExceeded("No time left")
+
+    monkeypatch.setattr(
+        standardize, "stream_medications", stream_medications)
+
+    response = standardize.lambda_handler({"body": json.dumps({
+        "text": "Lisinopril 10 mg tablet, take one by mouth daily",
+        "stream": True,
+    })}, None)
+
+    assert response["headers"]["Content-Type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in response["body"].splitlines()] == [
+        {"medication": "Lisinopril"},
+        {"error": "No time left", "status": "error"},
+    ]